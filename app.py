@@ -2,57 +2,131 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import json
 from operator import add
 from typing import final
-import dateutil.parser
-import babel
 from flask import (Flask, 
+    current_app,
     render_template, 
     request, 
     Response, 
     flash, 
     redirect, 
-    url_for
+    url_for,
+    session,
+    stream_with_context,
+    jsonify,
+    abort
 )
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
-from flask_wtf.csrf import CSRFProtect
+from flask_wtf.csrf import CSRFProtect, CSRFError, generate_csrf
 from wtforms.validators import ValidationError
 from forms import *
 from models import *
-import sys
+from queries import venue_areas, artists_page, shows_page, InvalidCursor
+from search import search
+from autocomplete import name_index
+from cache import page_cache
+from viewmodels import venue_detail, artist_detail
+from logs import structured_logging
+from instrumentation import sql_instrumentation
+from metrics import metrics
+from conditional import (conditional,
+    venues_fingerprint,
+    artists_fingerprint,
+    shows_fingerprint,
+    venue_fingerprint,
+    artist_fingerprint
+)
+from replicas import read_only
+from counters import show_created, shows_created, entity_deleted, refresh_counters_command
+import bulk
+import scheduling
+from explain import explain_command
+import export
+from importer import import_command
+from assets import assets, build_assets_command
+from images import images, warm_images_command
+from templating import template_cache, compile_templates_command
+from partitions import ensure_partitions_command, archive_shows_command
+from dates import format_datetime, locale_choices, reader_locale
+from config import config, engine_options
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-
-from models import db
-db.init_app(app)
-migrate = Migrate(app, db, compare_type=True)
-csrf = CSRFProtect(app)
+moment = Moment()
+migrate = Migrate(compare_type=True)
+csrf = CSRFProtect()
+
+def create_app(config_name=None, overrides=None):
+    # overrides are applied before anything reads the configuration, such
+    # as the engine options built from SQLALCHEMY_DATABASE_URI.
+    app = Flask(__name__)
+    app.config.from_object(config[config_name or os.getenv('FLASK_CONFIG', 'default')])
+    app.config.update(overrides or {})
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError('SECRET_KEY must be set in the environment')
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+    structured_logging.init_app(app)
+    moment.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    csrf.init_app(app)
+    app.cli.add_command(explain_command)
+    app.cli.add_command(refresh_counters_command)
+    app.cli.add_command(export.export_command)
+    app.cli.add_command(import_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(warm_images_command)
+    app.cli.add_command(compile_templates_command)
+    app.cli.add_command(ensure_partitions_command)
+    app.cli.add_command(archive_shows_command)
+    name_index.init_app(app)
+    page_cache.init_app(app)
+    sql_instrumentation.init_app(app)
+    metrics.init_app(app)
+    assets.init_app(app)
+    images.init_app(app)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.jinja_env.globals.update(locale_choices=locale_choices, reader_locale=reader_locale)
+    for rule, view, options in views:
+        app.add_url_rule(rule, view_func=view, **options)
+    for code_or_exception, handler in error_handlers:
+        app.register_error_handler(code_or_exception, handler)
+    # Last: templates are compiled against the filters registered above.
+    template_cache.init_app(app)
+
+    return app
 
 
 #----------------------------------------------------------------------------#
-# Filters.
+# Routes.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+# Views and error handlers are collected at import time and attached to each
+# app by create_app(), keeping endpoint names unprefixed ('venues', not
+# 'main.venues') for url_for and the templates.
+views = []
+error_handlers = []
+
+def route(rule, **options):
+    def decorator(view):
+        views.append((rule, view, options))
+        return view
+    return decorator
 
-app.jinja_env.filters['datetime'] = format_datetime
+def errorhandler(code_or_exception):
+    def decorator(handler):
+        error_handlers.append((code_or_exception, handler))
+        return handler
+    return decorator
 
 
 #----------------------------------------------------------------------------#
@@ -63,12 +137,26 @@ def display_errors(form):
     for fieldName, errorMessages in form.errors.items():
         return flash( 'Error: ' + ' '.join([str(message) for message in errorMessages]), 'warning')
 
+@errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    # A stale or hand-edited cursor restarts the listing from its first page.
+    return redirect(url_for(request.endpoint))
+
+
+#----------------------------------------------------------------------------#
+# Pagination.
+#----------------------------------------------------------------------------#
+
+def page_args():
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    return request.args.get('after'), max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@route('/')
 def index():
   return render_template('pages/home.html')
 
@@ -76,110 +164,48 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@route('/venues')
+@read_only
+@conditional(venues_fingerprint)
 def venues():
-    data = []
+    def render():
+        data, next_cursor = venue_areas(*page_args())
+        return render_template('fragments/venues.html', areas=data, next_cursor=next_cursor)
 
-    areas = Venue.query.with_entities(Venue.city, Venue.state).group_by(Venue.city, Venue.state).all()
+    return render_template('pages/venues.html', listing=page_cache.fragment(render));
 
-    for area in areas:
-        data_venues = []
-        
-        venues = Venue.query \
-            .filter_by(state=area.state) \
-            .filter_by(city=area.city) \
-            .all()
-
-        for venue in venues:
-            upcoming_shows = db.session \
-                .query(Show) \
-                .filter(Show.venue_id == venue.id) \
-                .filter(Show.start_time > datetime.now()) \
-                .all()
-
-            data_venues.append({
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': len(upcoming_shows)
-            })
-
-        data.append({
-            'city': area.city,
-            'state': area.state,
-            'venues': data_venues
-        })
-
-    return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+@route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     search_term = request.form['search_term']
-    search = '%{}%'.format(search_term)
-
-    venues = Venue.query \
-        .filter(Venue.name.ilike(search)) \
-        .all()
-
-    data_venues = []
-    for venue in venues:
-        upcoming_shows = Show.query \
-            .filter(Show.venue_id == venue.id) \
-            .filter(Show.start_time > datetime.now()) \
-            .all()
-        
-        data_venues.append({
-            'id': venue.id,
-            'name': venue.name,
-            'num_upcoming_shows': len(upcoming_shows)
-        })
-
-    response = {
-        'count': len(venues),
-        'data': data_venues
-    }
+    response = search(Venue, search_term, current_app.config['SEARCH_LIMIT'])
 
     form = VenueForm()
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''), form=form)
 
-@app.route('/venues/<int:venue_id>')
+@route('/venues/<int:venue_id>')
+@read_only
+@conditional(venue_fingerprint)
 def show_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
-
-    past_shows = db.session.query(Show).join(Venue).filter(Show.venue_id==venue_id). \
-        filter(Show.start_time <= datetime.now()).all()
-
-    upcoming_shows = db.session.query(Show).join(Venue).filter(Show.venue_id==venue_id). \
-        filter(Show.start_time > datetime.now()).all()
+    venue = venue_detail(venue_id)
+    if venue is None:
+        abort(404)
 
-    for show in past_shows:
-        show.start_time = show.start_time.strftime('%m/%d/%Y, %H:%M')
-
-    for show in upcoming_shows:
-        show.start_time = show.start_time.strftime('%m/%d/%Y, %H:%M')
-
-    data = vars(venue)
-
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
-
-    return render_template('pages/show_venue.html', venue=data)
+    return render_template('pages/show_venue.html', venue=venue)
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@route('/venues/create', methods=['POST'])
 def create_venue_submission():
     error = False
     form = VenueForm()
-    form.validate()
     if not form.validate():
         display_errors(form)
 
@@ -205,119 +231,86 @@ def create_venue_submission():
         genres=genres)
         db.session.add(venue)
         db.session.commit()
+        venue_id = venue.id
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        current_app.logger.exception('Could not create venue %s', name)
     finally:
         db.session.close()
     
     if error:
         flash('An error ocurred. Venue ' + name + ' could not be listed.')
     else:
+        name_index.add('venue', venue_id, name)
+        page_cache.invalidate()
         flash('Venue ' + name + ' was successfully listed!')
 
     return render_template('pages/home.html')
   
-@app.route('/venues/<venue_id>', methods=['DELETE', 'POST'])
+@route('/venues/<venue_id>', methods=['DELETE', 'POST'])
 def delete_venue(venue_id):
     error = False
     try:
+        entity_deleted(Venue, venue_id)
         Venue.query.filter(Venue.id == venue_id).delete()
         db.session.commit()
     except:
         db.session.rollback()
         error = True
+        current_app.logger.exception('Could not delete venue %s', venue_id)
     finally:
         db.session.close()
 
     if error:
         flash('An error ocurred. Venue could not be removed.')
     else:
+        name_index.remove('venue', int(venue_id))
+        page_cache.invalidate()
         flash('Venue was successfully removed!')
 
     return render_template('pages/home.html')
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@route('/artists')
+@read_only
+@conditional(artists_fingerprint)
 def artists():
-    artists = Artist.query.all()
+    def render():
+        data, next_cursor = artists_page(*page_args())
+        return render_template('fragments/artists.html', artists=data, next_cursor=next_cursor)
 
-    data = []
+    return render_template('pages/artists.html', listing=page_cache.fragment(render))
 
-    for artist in artists:
-        data.append({
-            'id': artist.id,
-            'name': artist.name
-        })
-
-    return render_template('pages/artists.html', artists=data)
-
-@app.route('/artists/search', methods=['POST'])
+@route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
     search_term = request.form['search_term']
-    search = '%{}%'.format(search_term)
-
-    artists = Artist.query \
-        .filter(Artist.name.ilike(search)) \
-        .all()
-
-    data_artists = []
-    for artist in artists:
-        upcoming_shows = Show.query \
-            .filter(Show.artist_id == artist.id) \
-            .filter(Show.start_time > datetime.now()) \
-            .all()
-        
-        data_artists.append({
-            'id': artist.id,
-            'name': artist.name,
-            'num_upcoming_shows': len(upcoming_shows)
-        })
-
-    response = {
-        'count': len(artists),
-        'data': data_artists
-    }
+    response = search(Artist, search_term, current_app.config['SEARCH_LIMIT'])
 
     form = ArtistForm()
 
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''), form=form)
 
-@app.route('/artists/<int:artist_id>')
+@route('/artists/<int:artist_id>')
+@read_only
+@conditional(artist_fingerprint)
 def show_artist(artist_id):
-    artist = Artist.query.get_or_404(artist_id)
+    artist = artist_detail(artist_id)
+    if artist is None:
+        abort(404)
 
-    past_shows = db.session.query(Show).join(Artist).filter(Show.artist_id==artist_id). \
-        filter(Show.start_time <= datetime.now()).all()
-
-    upcoming_shows = db.session.query(Show).join(Artist).filter(Show.artist_id==artist_id). \
-        filter(Show.start_time > datetime.now()).all()
-
-    for show in past_shows:
-        show.start_time = show.start_time.strftime('%m/%d/%Y, %H:%M')
-
-    for show in upcoming_shows:
-        show.start_time = show.start_time.strftime('%m/%d/%Y, %H:%M')
-
-    data = vars(artist)
-
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
-
-    return render_template('pages/show_artist.html', artist=data)
+    return render_template('pages/show_artist.html', artist=artist)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     form = ArtistForm()
 
-    artist = Artist.query.filter(Artist.id == artist_id).first()
+    artist = Artist.query.options(*load_options(Artist, 'edit')).filter(Artist.id == artist_id).first()
 
     form.name.data = artist.name
     form.city.data = artist.city
@@ -333,7 +326,7 @@ def edit_artist(artist_id):
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     error = False
     form = ArtistForm()
@@ -343,7 +336,7 @@ def edit_artist_submission(artist_id):
         return redirect(url_for('edit_artist', artist_id=artist_id))
 
     try:
-        artist = Artist.query.filter(Artist.id == artist_id).first()
+        artist = Artist.query.options(*load_options(Artist, 'edit')).filter(Artist.id == artist_id).first()
 
         artist.name = form.name.data
         artist.city = form.city.data
@@ -360,21 +353,23 @@ def edit_artist_submission(artist_id):
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        current_app.logger.exception('Could not update artist %s', artist_id)
     finally:
         db.session.close()
     
     if error:
         flash('An error ocurred. Artist ' + request.form['name'] + ' could not be updated.')
     else:
+        name_index.add('artist', artist_id, form.name.data)
+        page_cache.invalidate()
         flash('Artist ' + request.form['name'] + ' was successfully updated!')
 
     return redirect(url_for('show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     form = VenueForm()
-    venue = Venue.query.filter(Venue.id == venue_id).first()
+    venue = Venue.query.options(*load_options(Venue, 'edit')).filter(Venue.id == venue_id).first()
 
     form.name.data = venue.name
     form.city.data = venue.city
@@ -390,7 +385,7 @@ def edit_venue(venue_id):
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     error = False
     form = VenueForm()
@@ -400,7 +395,7 @@ def edit_venue_submission(venue_id):
         return redirect(url_for('edit_venue', venue_id=venue_id))
   
     try:
-        venue = Venue.query.filter(Venue.id == venue_id).first()
+        venue = Venue.query.options(*load_options(Venue, 'edit')).filter(Venue.id == venue_id).first()
 
         venue.name = form.name.data
         venue.city = form.city.data
@@ -418,13 +413,15 @@ def edit_venue_submission(venue_id):
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        current_app.logger.exception('Could not update venue %s', venue_id)
     finally:
         db.session.close()
     
     if error:
         flash('An error ocurred. Venue ' + request.form['name'] + ' could not be updated.')
     else:
+        name_index.add('venue', venue_id, form.name.data)
+        page_cache.invalidate()
         flash('Venue ' + request.form['name'] + ' was successfully updated!')
 
     return redirect(url_for('show_venue', venue_id=venue_id))
@@ -432,12 +429,12 @@ def edit_venue_submission(venue_id):
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@route('/artists/create', methods=['POST'])
 def create_artist_submission():
     error = False
     form = ArtistForm()
@@ -465,16 +462,19 @@ def create_artist_submission():
             genres=genres)
         db.session.add(artist)
         db.session.commit()
+        artist_id = artist.id
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        current_app.logger.exception('Could not create artist %s', name)
     finally:
         db.session.close()
     
     if error:
         flash('An error ocurred. Artist ' + name + ' could not be listed.')
     else:
+        name_index.add('artist', artist_id, name)
+        page_cache.invalidate()
         flash('Artist ' + name + ' was successfully listed!')
 
     return render_template('pages/home.html')
@@ -483,54 +483,56 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@route('/shows')
+@read_only
+@conditional(shows_fingerprint)
 def shows():
-    shows = Show.query.order_by(Show.start_time.desc()).all()
-    data = []
-    for show in shows:
-        venue = Venue.query.filter(Venue.id == show.venue_id).first()
-        artist =Artist.query.filter(Artist.id == show.artist_id).first()
-
-        data.append({
-            'venue_id': show.venue_id,
-            'venue_name': venue.name,
-            'artist_id': show.artist_id,
-            'artist_name': artist.name,
-            'artist_image_link': artist.image_link,
-            'start_time': str(show.start_time)
-        })
+    def render():
+        data, next_cursor = shows_page(*page_args())
+        return render_template('fragments/shows.html', shows=data, next_cursor=next_cursor)
 
+    return render_template('pages/shows.html', listing=page_cache.fragment(render))
 
-    return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
+@route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@route('/shows/create', methods=['POST'])
 def create_show_submission():
     error = False
     form = ShowForm()
-    form.validate()
     if not form.validate():
         display_errors(form)
 
         return render_template('forms/new_show.html', form=form)
-  
-    try:
-        artist_id = form.artist_id.data
-        venue_id = form.venue_id.data
-        start_time = form.start_time.data
 
-        show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
+    artist_id = int(form.artist_id.data)
+    venue_id = int(form.venue_id.data)
+    start_time = form.start_time.data
+    end_time = form.end_time()
+    if end_time is None:
+        form.duration.errors.append(INVALID_END)
+        display_errors(form)
+        return render_template('forms/new_show.html', form=form)
+    conflicts = scheduling.find_conflicts([{'artist_id': artist_id, 'venue_id': venue_id, 'start_time': start_time, 'end_time': end_time}])
+    if conflicts:
+        for field, message in conflicts[0]['errors'].items():
+            form[field].errors.append(message)
+        display_errors(form)
+        return render_template('forms/new_show.html', form=form)
+
+    try:
+        show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time, end_time=end_time)
         db.session.add(show)
+        show_created(venue_id, artist_id, start_time)
         db.session.commit()
+        page_cache.invalidate()
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        current_app.logger.exception('Could not create show')
     finally:
         db.session.close()
     
@@ -541,37 +543,133 @@ def create_show_submission():
 
     return render_template('pages/home.html')
 
-@app.errorhandler(404)
+@route('/shows/bulk')
+def create_shows_bulk():
+    # JSON clients fetch a CSRF token here, along with the session cookie it
+    # belongs to, and send it back in an X-CSRFToken header.
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        return jsonify({'csrf_token': generate_csrf()})
+    return render_template('forms/bulk_shows.html')
+
+@route('/shows/bulk', methods=['POST'])
+def create_shows_bulk_submission():
+    # Accepts a JSON list of shows, a CSV upload or pasted CSV. Answers JSON
+    # requests in kind and everything else with the form and its errors.
+    wants_json = request.is_json
+    try:
+        if wants_json:
+            rows = bulk.read_json(request.get_json())
+        else:
+            upload = request.files.get('file')
+            rows = bulk.read_csv(upload.read().decode('utf-8-sig') if upload and upload.filename
+                else request.form.get('csv', ''))
+        if len(rows) > current_app.config['BULK_SHOWS_MAX_ROWS']:
+            raise bulk.BulkError('At most {} shows at a time'.format(current_app.config['BULK_SHOWS_MAX_ROWS']))
+    except (bulk.BulkError, UnicodeDecodeError) as error:
+        if wants_json:
+            return jsonify({'error': str(error)}), 400
+        flash(str(error))
+        return render_template('forms/bulk_shows.html'), 400
+
+    shows, errors = bulk.validate_rows(rows)
+    if not errors:
+        # Once every row reads, so the whole batch is checked together.
+        errors = scheduling.find_conflicts(shows)
+    if errors or not shows:
+        if wants_json:
+            return jsonify({'created': 0, 'errors': errors}), 422
+        flash('No shows were listed.' if errors else 'There were no shows to list.')
+        return render_template('forms/bulk_shows.html', errors=errors, csv=request.form.get('csv', '')), 422
+
+    try:
+        bulk.insert_shows(shows)
+        shows_created(shows)
+        db.session.commit()
+        page_cache.invalidate()
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Could not create %s shows', len(shows))
+        if wants_json:
+            return jsonify({'error': 'Shows could not be listed.'}), 500
+        flash('An error ocurred. Shows could not be listed.')
+        return render_template('forms/bulk_shows.html'), 500
+    finally:
+        db.session.close()
+
+    if wants_json:
+        return jsonify({'created': len(shows), 'errors': []}), 201
+    flash('{} shows were successfully listed!'.format(len(shows)))
+    return render_template('pages/home.html')
+
+#  Export
+#  ----------------------------------------------------------------
+
+@route('/export/<kind>.<format>')
+@read_only
+def export_table(kind, format):
+    if kind not in export.MODELS or format not in export.FORMATS:
+        abort(404)
+
+    compress = request.accept_encodings['gzip'] > 0
+    body = export.export(kind, format, compress, current_app.config['EXPORT_BATCH_SIZE'])
+    response = Response(stream_with_context(body), mimetype=export.FORMATS[format])
+    response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(kind, format)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@route('/api/autocomplete')
+@read_only
+def autocomplete():
+    name_index.ensure_built()
+    results = name_index.search(
+        request.args.get('q', ''),
+        kind=request.args.get('type'),
+        limit=current_app.config['AUTOCOMPLETE_LIMIT'])
+
+    return jsonify(results)
+
+#  Preferences
+#  ----------------------------------------------------------------
+
+@route('/preferences', methods=['POST'])
+def set_preferences():
+    # Locale used to format dates, kept in the session.
+    locale = request.form.get('locale')
+    if locale in current_app.config['LOCALES']:
+        session['locale'] = locale
+    return redirect(request.referrer or url_for('index'))
+
+@errorhandler(CSRFError)
+def csrf_error(error):
+    if request.is_json:
+        return jsonify({'error': error.description}), 400
+    return error
+
+@errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
-    csrf.init_app(app)
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
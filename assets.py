@@ -0,0 +1,242 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import uuid
+import brotli
+import click
+import rcssmin
+import rjsmin
+from flask import abort, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+
+#----------------------------------------------------------------------------#
+# Bundles.
+#----------------------------------------------------------------------------#
+
+# Sources, relative to static/, concatenated in order. Scripts keep the
+# order the layout loaded them in: head.js runs while the head is parsed,
+# app.js is deferred until after jQuery.
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'app.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# Written next to the hashed files: brotli for clients that accept it, gzip
+# for the rest. Fonts and images referenced from CSS are fingerprinted too,
+# and compressed when that makes them smaller.
+ENCODINGS = (
+    ('br', '.br', lambda data: brotli.compress(data, quality=11)),
+    ('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.eot', '.otf')
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+def fingerprint(name, data):
+    root, ext = os.path.splitext(os.path.basename(name))
+    return '{}.{}{}'.format(root, hashlib.sha256(data).hexdigest()[:12], ext)
+
+def minify(name, text):
+    if name.endswith('.css'):
+        return rcssmin.cssmin(text)
+    return rjsmin.jsmin(text)
+
+
+class Build:
+    # Collects the files of one build: hashed name -> bytes.
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.files = {}
+
+    def add(self, name, data):
+        filename = fingerprint(name, data)
+        self.files[filename] = data
+        return filename
+
+    def read(self, source):
+        with open(os.path.join(self.static_folder, source), encoding='utf-8') as f:
+            return f.read()
+
+    def rewrite_urls(self, source, text):
+        # url()s are relative to the source file; those pointing at a file
+        # we have are swapped for its hashed copy. The rest still resolve,
+        # since dist/ sits at the same depth as css/.
+        directory = os.path.dirname(source)
+
+        def replace(match):
+            quote, url = match.groups()
+            if re.match(r'^([a-z]+:|/|#)', url):
+                return match.group(0)
+            path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+            target = os.path.normpath(os.path.join(self.static_folder, directory, path))
+            if not os.path.isfile(target):
+                return match.group(0)
+            with open(target, 'rb') as f:
+                filename = self.add(path, f.read())
+            return 'url({0}{1}{2}{0})'.format(quote, filename, suffix)
+
+        return CSS_URL.sub(replace, text)
+
+    def bundle(self, name, sources):
+        parts = []
+        for source in sources:
+            text = self.read(source)
+            if name.endswith('.css'):
+                text = self.rewrite_urls(source, text)
+            parts.append(minify(name, text))
+        # A statement left open at the end of one script must not swallow
+        # the start of the next.
+        separator = '\n' if name.endswith('.css') else ';\n'
+        return self.add(name, separator.join(parts).encode())
+
+
+def build(static_folder, clean=False):
+    # Writes every bundle, its compressed variants and manifest.json into
+    # static/dist. Earlier builds are kept, so pages cached before a deploy
+    # still find their assets, unless clean is set.
+    directory = os.path.join(static_folder, 'dist')
+    os.makedirs(directory, exist_ok=True)
+
+    collected = Build(static_folder)
+    bundles = {name: collected.bundle(name, sources) for name, sources in BUNDLES.items()}
+
+    files = {}
+    for filename, data in collected.files.items():
+        variants = {'': data}
+        if filename.endswith(COMPRESSIBLE):
+            for encoding, suffix, compress in ENCODINGS:
+                compressed = compress(data)
+                if len(compressed) < len(data):
+                    variants[suffix] = compressed
+        for suffix, content in variants.items():
+            path = os.path.join(directory, filename + suffix)
+            if not os.path.exists(path):
+                write(path, content)
+        files[filename] = [encoding for encoding, suffix, compress in ENCODINGS if suffix in variants]
+
+    manifest = {'bundles': bundles, 'files': files}
+    write(os.path.join(directory, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    if clean:
+        suffixes = [''] + [suffix for encoding, suffix, compress in ENCODINGS]
+        keep = {filename + suffix for filename in files for suffix in suffixes}
+        for name in os.listdir(directory):
+            if name != 'manifest.json' and name not in keep:
+                os.remove(os.path.join(directory, name))
+    return manifest
+
+def write(path, data):
+    temporary = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+#----------------------------------------------------------------------------#
+# Runtime.
+#----------------------------------------------------------------------------#
+
+class Assets:
+    # Loads the manifest, building it first when it is missing or older than
+    # a source (ASSETS_AUTO_BUILD), and serves the hashed files from
+    # /static/dist with far-future caching. In debug mode sources are
+    # checked again on every lookup, so edits show up on reload.
+
+    def __init__(self):
+        self.static_folder = None
+        self.manifest = {'bundles': {}, 'files': {}}
+        self.max_age = 365 * 24 * 3600
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.max_age = app.config.get('ASSETS_MAX_AGE', self.max_age)
+        self.auto_build = app.config.get('ASSETS_AUTO_BUILD', True)
+        self.load()
+        app.add_url_rule('/static/dist/<path:filename>', 'asset', self.send)
+        app.jinja_env.globals['asset_url'] = self.url
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.static_folder, 'dist', 'manifest.json')
+
+    def stale(self):
+        try:
+            built_at = os.stat(self.manifest_path).st_mtime
+        except FileNotFoundError:
+            return True
+        return any(
+            os.stat(os.path.join(self.static_folder, source)).st_mtime > built_at
+            for sources in BUNDLES.values() for source in sources)
+
+    def load(self):
+        if self.auto_build and self.stale():
+            self.manifest = build(self.static_folder)
+            return
+        try:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+
+    def url(self, name):
+        # url_for('static', ...) for bundles, by bundle name. Anything not
+        # bundled (or not built) falls back to the plain static URL.
+        if current_app.debug and self.auto_build and self.stale():
+            self.load()
+        filename = self.manifest['bundles'].get(name)
+        if filename is None:
+            return url_for('static', filename=name)
+        return url_for('asset', filename=filename)
+
+    def send(self, filename):
+        encodings = self.manifest['files'].get(filename)
+        if encodings is None:
+            abort(404)
+
+        directory = os.path.join(self.static_folder, 'dist')
+        for encoding, suffix, compress in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                response = send_from_directory(directory, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0], max_age=self.max_age)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(directory, filename, max_age=self.max_age)
+
+        # The name changes with the content, so a copy never goes stale.
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+assets = Assets()
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove files left over from earlier builds.')
+@with_appcontext
+def build_assets_command(clean):
+    """Bundle, minify, fingerprint and precompress the static assets."""
+    manifest = build(current_app.static_folder, clean)
+    for name, filename in sorted(manifest['bundles'].items()):
+        click.echo('{} -> dist/{}'.format(name, filename))
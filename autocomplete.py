@@ -0,0 +1,128 @@
+import bisect
+import threading
+import time
+import unicodedata
+from models import db, Venue, Artist
+
+
+#----------------------------------------------------------------------------#
+# Name index.
+#----------------------------------------------------------------------------#
+
+KINDS = {
+    'venue': Venue,
+    'artist': Artist,
+}
+
+def normalize(name):
+    # Case- and accent-insensitive: "Café Étoile" is found by "cafe et".
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+def keys(name):
+    # A name is reachable from the start of each of its words, so
+    # "blues" finds "The Blues Kitchen".
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class NameIndex:
+    # Sorted array of (key, kind, id, name) searched with bisect. A rebuild
+    # swaps in a new array; single edits are made in place under the lock.
+    # Readers never take it: one racing an edit may skip or see twice an
+    # entry being moved, and never fails.
+
+    def __init__(self):
+        self._entries = []
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._refreshing = False
+        self.refresh_interval = None
+        self.app = None
+
+    def init_app(self, app):
+        self.refresh_interval = app.config.get('AUTOCOMPLETE_REFRESH_INTERVAL')
+        self.app = app
+
+    def build(self):
+        entries = []
+        index_keys = {}
+        for kind, model in KINDS.items():
+            for id, name in db.session.query(model.id, model.name):
+                index_keys[(kind, id)] = keys(name)
+                entries.extend((key, kind, id, name) for key in index_keys[(kind, id)])
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._keys = index_keys
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        if self._built_at is None:
+            self.build()
+        elif self.refresh_interval and not self._refreshing \
+                and time.monotonic() - self._built_at > self.refresh_interval:
+            # Other workers' edits only reach this process through a rebuild,
+            # which happens off the request thread.
+            self._refreshing = True
+            threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self.app.app_context():
+                self.build()
+        finally:
+            self._refreshing = False
+
+    def add(self, kind, id, name):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._discard(kind, id)
+            self._keys[(kind, id)] = keys(name)
+            for key in self._keys[(kind, id)]:
+                bisect.insort(self._entries, (key, kind, id, name))
+
+    def remove(self, kind, id):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._discard(kind, id)
+            self._keys.pop((kind, id), None)
+
+    def _discard(self, kind, id):
+        # Called with the lock held.
+        entries = self._entries
+        for key in self._keys.get((kind, id), []):
+            i = bisect.bisect_left(entries, (key, kind, id))
+            if i < len(entries) and entries[i][:3] == (key, kind, id):
+                del entries[i]
+
+    def search(self, prefix, kind=None, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        entries = self._entries
+        results = []
+        seen = set()
+        i = bisect.bisect_left(entries, (prefix,))
+        while len(results) < limit:
+            try:
+                key, entry_kind, id, name = entries[i]
+            except IndexError:
+                # The end, possibly moved by an edit since the last step.
+                break
+            if not key.startswith(prefix):
+                break
+            if (kind is None or entry_kind == kind) and (entry_kind, id) not in seen:
+                seen.add((entry_kind, id))
+                results.append({'type': entry_kind, 'id': id, 'name': name})
+            i += 1
+
+        return results
+
+
+name_index = NameIndex()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+# Run from the repository root: python -m benchmarks ...
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import run_client, run_http, report, save, compare
+
+
+def load_app(args):
+    # Benchmark what production runs; any fixed key will do here.
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from app import create_app
+
+    overrides = {'WTF_CSRF_ENABLED': False}
+    if args.database_url:
+        overrides['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    if not getattr(args, 'cache', True):
+        # Measure the views themselves rather than the listing cache.
+        overrides['CACHE_BACKEND'] = 'none'
+    return create_app(args.config, overrides)
+
+def seed_command(args):
+    from benchmarks.seed import seed
+
+    app = load_app(args)
+    with app.app_context():
+        seed(venues=args.venues, artists=args.artists, shows=args.shows, areas=args.areas,
+             random_seed=args.seed)
+
+def run_command(args):
+    app = load_app(args)
+    endpoints = args.endpoint or None
+    if args.url:
+        results = run_http(app, args.url, args.duration, args.concurrency, endpoints)
+    else:
+        results = run_client(app, args.iterations, args.warmup, endpoints)
+
+    options = {key: value for key, value in vars(args).items() if key not in ('func', 'database_url')}
+    output = args.output or os.path.join('benchmarks', 'results',
+        datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    save(report(app, 'http' if args.url else 'client', results, options), output)
+    print('Saved {}'.format(output))
+
+def compare_command(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    compare(before, after)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--database-url', help='Override SQLALCHEMY_DATABASE_URI.')
+    parser.add_argument('--config', default='production', help='Configuration to create the app with.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help='Replace the database contents with synthetic data.')
+    seed.add_argument('--venues', type=int, default=10000)
+    seed.add_argument('--artists', type=int, default=50000)
+    seed.add_argument('--shows', type=int, default=1000000)
+    seed.add_argument('--areas', type=int, default=600)
+    seed.add_argument('--seed', type=int, default=1)
+    seed.set_defaults(func=seed_command)
+
+    run = commands.add_parser('run', help='Measure every endpoint and save the results as JSON.')
+    run.add_argument('--iterations', type=int, default=200)
+    run.add_argument('--warmup', type=int, default=10)
+    run.add_argument('--endpoint', action='append', help='Only run this endpoint (repeatable).')
+    run.add_argument('--no-cache', dest='cache', action='store_false', help='Disable the listing cache.')
+    run.add_argument('--url', help='Load-test a running server instead of the test client.')
+    run.add_argument('--duration', type=float, default=10)
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--output', help='Where to save the JSON results.')
+    run.set_defaults(func=run_command)
+
+    diff = commands.add_parser('compare', help='Compare two saved results.')
+    diff.add_argument('before')
+    diff.add_argument('after')
+    diff.set_defaults(func=compare_command)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
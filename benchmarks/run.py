@@ -0,0 +1,244 @@
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from models import db, Venue, Artist, Show
+from images import images
+
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+# (name, method, path, form data); {venue_id} and {artist_id} are filled from
+# a random sample of existing rows so detail pages are not all cache-warm,
+# {splash_image} with the URL of a static/img derivative.
+ENDPOINTS = [
+    ('index', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('artists', 'GET', '/artists', None),
+    ('shows', 'GET', '/shows', None),
+    ('show_venue', 'GET', '/venues/{venue_id}', None),
+    ('show_artist', 'GET', '/artists/{artist_id}', None),
+    ('edit_venue', 'GET', '/venues/{venue_id}/edit', None),
+    ('edit_artist', 'GET', '/artists/{artist_id}/edit', None),
+    ('search_venues', 'POST', '/venues/search', {'search_term': 'blue'}),
+    ('search_artists', 'POST', '/artists/search', {'search_term': 'tiger'}),
+    ('autocomplete', 'GET', '/api/autocomplete?q=mid', None),
+    ('create_venue_form', 'GET', '/venues/create', None),
+    ('create_artist_form', 'GET', '/artists/create', None),
+    ('create_show_form', 'GET', '/shows/create', None),
+    ('bulk_shows_form', 'GET', '/shows/bulk', None),
+    ('export_venues', 'GET', '/export/venues.csv', None),
+    ('export_shows', 'GET', '/export/shows.ndjson', None),
+    ('image', 'GET', '{splash_image}', None),
+]
+
+# Not measured:
+#  - POST /venues/create, /artists/create, /shows/create, /shows/bulk and the
+#    edit and delete POSTs write rows, so every run would change the data the
+#    other endpoints are measured on, and a repeated show is refused as a
+#    clash after the first iteration.
+#  - POST /preferences only sets a session value and redirects.
+#  - /images/venues/... and /images/artists/... fetch their originals from
+#    the image_link hosts on first request, so they measure the network;
+#    'image' covers the resize-and-serve path with a local original.
+#  - /static/dist/... and /metrics are plain file and text responses.
+
+SPLASH_IMAGE = 'front-splash.jpg'
+
+def sample_ids(size=50):
+    with current_app.test_request_context():
+        version = images.version('static', SPLASH_IMAGE)
+        splash_image = images.url('static', SPLASH_IMAGE, version, 640, images.formats[-1])
+    return {
+        'venue_id': [id for id, in db.session.query(Venue.id).order_by(func.random()).limit(size)] or [1],
+        'artist_id': [id for id, in db.session.query(Artist.id).order_by(func.random()).limit(size)] or [1],
+        'splash_image': splash_image,
+    }
+
+def requests_for(path, ids, iterations):
+    return [path.format(venue_id=ids['venue_id'][i % len(ids['venue_id'])],
+                        artist_id=ids['artist_id'][i % len(ids['artist_id'])],
+                        splash_image=ids['splash_image'])
+            for i in range(iterations)]
+
+
+#----------------------------------------------------------------------------#
+# Statistics.
+#----------------------------------------------------------------------------#
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of an already sorted list.
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+def summarize(latencies, elapsed, errors, statements=None):
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+    if statements is not None:
+        result['statements_per_request'] = round(statements / len(latencies), 2) if latencies else None
+    return result
+
+
+#----------------------------------------------------------------------------#
+# Runners.
+#----------------------------------------------------------------------------#
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self.increment)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self.increment)
+
+    def increment(self, *args):
+        self.count += 1
+
+def run_client(app, iterations=200, warmup=10, endpoints=None, echo=print):
+    # Drives each route in-process through Flask's test client.
+    with app.app_context():
+        ids = sample_ids()
+    client = app.test_client()
+    results = {}
+
+    for name, method, path, data in ENDPOINTS:
+        if endpoints and name not in endpoints:
+            continue
+        for url in requests_for(path, ids, warmup):
+            client.open(url, method=method, data=data)
+
+        latencies = []
+        errors = 0
+        with StatementCounter() as counter:
+            started = time.perf_counter()
+            for url in requests_for(path, ids, iterations):
+                begin = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                # Streamed responses (exports) are only produced when read.
+                response.get_data()
+                latencies.append(time.perf_counter() - begin)
+                errors += response.status_code >= 400
+            elapsed = time.perf_counter() - started
+
+        results[name] = summarize(latencies, elapsed, errors, counter.count)
+        echo('{:<18} p50 {p50_ms:>9} ms  p95 {p95_ms:>9} ms  p99 {p99_ms:>9} ms  {throughput_rps:>8} rps  {statements_per_request:>6} stmts'
+            .format(name, **results[name]))
+
+    return results
+
+def run_http(app, base_url, duration=10, concurrency=8, endpoints=None, echo=print):
+    # Drives a running server (e.g. gunicorn) with `concurrency` threads per
+    # endpoint for `duration` seconds. POST endpoints are skipped because
+    # they need a CSRF token from a browser session.
+    with app.app_context():
+        ids = sample_ids()
+    results = {}
+
+    for name, method, path, data in ENDPOINTS:
+        if method != 'GET' or (endpoints and name not in endpoints):
+            continue
+        urls = requests_for(path, ids, 1000)
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker(offset):
+            i = offset
+            while time.perf_counter() < deadline:
+                begin = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(base_url.rstrip('/') + urls[i % len(urls)]) as response:
+                        response.read()
+                    failed = False
+                except Exception:
+                    failed = True
+                latency = time.perf_counter() - begin
+                with lock:
+                    latencies.append(latency)
+                    errors[0] += failed
+                i += concurrency
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        results[name] = summarize(latencies, time.perf_counter() - started, errors[0])
+        echo('{:<18} p50 {p50_ms:>9} ms  p95 {p95_ms:>9} ms  p99 {p99_ms:>9} ms  {throughput_rps:>8} rps'
+            .format(name, **results[name]))
+
+    return results
+
+
+#----------------------------------------------------------------------------#
+# Reports.
+#----------------------------------------------------------------------------#
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report(app, mode, results, options):
+    with app.app_context():
+        counts = {
+            'venues': db.session.query(func.count(Venue.id)).scalar(),
+            'artists': db.session.query(func.count(Artist.id)).scalar(),
+            'shows': db.session.query(func.count(Show.id)).scalar(),
+        }
+        dialect = db.engine.dialect.name
+
+    return {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'database': dialect,
+        'rows': counts,
+        'mode': mode,
+        'options': options,
+        'endpoints': results,
+    }
+
+def save(result, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+def compare(before, after, echo=print):
+    echo('{:<18} {:>12} {:>12} {:>8}   {:>12} {:>12} {:>8}'.format(
+        'endpoint', 'p50 before', 'p50 after', 'change', 'p95 before', 'p95 after', 'change'))
+    for name, stats in after['endpoints'].items():
+        old = before['endpoints'].get(name)
+        if not old:
+            continue
+        columns = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0
+            columns.extend([old[key], stats[key], '{:+.1f}%'.format(change)])
+        echo('{:<18} {:>12} {:>12} {:>8}   {:>12} {:>12} {:>8}'.format(name, *columns))
@@ -0,0 +1,133 @@
+import random
+import string
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from enums import Genre, State
+from models import db, Venue, Artist, Show, SHOW_DURATION
+from counters import refresh_upcoming_counts
+
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+CHUNK_SIZE = 10000
+
+WORDS = [
+    'Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Silver', 'Wild',
+    'Lucky', 'Broken', 'Hidden', 'Neon', 'Crystal', 'Iron', 'Paper', 'Rolling',
+    'Moon', 'Tiger', 'River', 'Garden', 'Hall', 'Room', 'Lounge', 'Club',
+    'Cellar', 'Tavern', 'Theatre', 'House', 'Band', 'Trio', 'Collective', 'Kids',
+]
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for i in range(count))
+
+def phone(rng):
+    return '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999))
+
+def genres(rng):
+    return [genre.name for genre in rng.sample(list(Genre), rng.randint(1, 3))]
+
+def cities(rng, count):
+    states = [state.value for state in State]
+    names = set()
+    while len(names) < count:
+        names.add((words(rng, 1) + ' ' + ''.join(rng.choice(string.ascii_lowercase) for i in range(5)).title(),
+            rng.choice(states)))
+    return sorted(names)
+
+def show_time(rng, now, past_days, future_days):
+    # Most shows are in the past; bookings thin out further ahead, happen in
+    # the evening and cluster on Fridays and Saturdays.
+    if rng.random() < past_days / (past_days + future_days):
+        day = now - timedelta(days=rng.uniform(0, past_days))
+    else:
+        day = now + timedelta(days=min(rng.expovariate(3.0 / future_days), future_days))
+    if day.weekday() < 4 and rng.random() < 0.5:
+        day += timedelta(days=4 - day.weekday() + rng.randint(0, 1))
+    return day.replace(hour=rng.choice([19, 20, 20, 21, 21, 22]), minute=rng.choice([0, 30]), second=0, microsecond=0)
+
+def insert(model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + CHUNK_SIZE])
+    db.session.commit()
+
+def seed(venues=10000, artists=50000, shows=1000000, areas=600,
+         past_days=3 * 365, future_days=365, random_seed=1, truncate=True, echo=print):
+    rng = random.Random(random_seed)
+    now = datetime.now()
+
+    if truncate:
+        db.session.execute(text('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+        db.session.commit()
+
+    # Some cities have far more venues than others.
+    area_list = cities(rng, areas)
+    area_weights = [1.0 / (rank + 1) for rank in range(len(area_list))]
+
+    echo('Seeding {} venues...'.format(venues))
+    rows = []
+    for i in range(venues):
+        city, state = rng.choices(area_list, area_weights)[0]
+        rows.append({
+            'name': 'The ' + words(rng, 2),
+            'city': city,
+            'state': state,
+            'address': '{} {} St'.format(rng.randint(1, 9999), words(rng, 1)),
+            'phone': phone(rng),
+            'image_link': 'https://images.example.com/venues/{}.jpg'.format(i),
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(i),
+            'website': 'https://venue{}.example.com'.format(i),
+            'seeking_talent': rng.random() < 0.3,
+            'seeking_description': 'Looking for local acts.',
+            'genres': genres(rng),
+        })
+    insert(Venue, rows)
+
+    echo('Seeding {} artists...'.format(artists))
+    rows = []
+    for i in range(artists):
+        city, state = rng.choice(area_list)
+        rows.append({
+            'name': words(rng, rng.randint(1, 3)),
+            'city': city,
+            'state': state,
+            'phone': phone(rng),
+            'image_link': 'https://images.example.com/artists/{}.jpg'.format(i),
+            'facebook_link': 'https://www.facebook.com/artist{}'.format(i),
+            'website': 'https://artist{}.example.com'.format(i),
+            'seeking_venue': rng.random() < 0.5,
+            'seeking_description': 'Touring this season.',
+            'genres': genres(rng),
+        })
+    insert(Artist, rows)
+
+    # Popular venues and artists play far more often (Pareto-distributed).
+    # A venue or artist has at most one show a night, so none overlap; a
+    # show that finds no free night in a few draws is left out.
+    echo('Seeding {} shows...'.format(shows))
+    venue_weights = [rng.paretovariate(1.2) for i in range(venues)]
+    artist_weights = [rng.paretovariate(1.2) for i in range(artists)]
+    booked = set()
+    for start in range(0, shows, CHUNK_SIZE):
+        count = min(CHUNK_SIZE, shows - start)
+        venue_ids = rng.choices(range(1, venues + 1), venue_weights, k=count)
+        artist_ids = rng.choices(range(1, artists + 1), artist_weights, k=count)
+        rows = []
+        for venue_id, artist_id in zip(venue_ids, artist_ids):
+            for attempt in range(5):
+                start_time = show_time(rng, now, past_days, future_days)
+                nights = (('venue', venue_id, start_time.date()), ('artist', artist_id, start_time.date()))
+                if not booked.intersection(nights):
+                    booked.update(nights)
+                    rows.append({'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time,
+                        'end_time': start_time + SHOW_DURATION})
+                    break
+        if rows:
+            db.session.execute(Show.__table__.insert(), rows)
+        db.session.commit()
+
+    refresh_upcoming_counts(now)
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
@@ -0,0 +1,105 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from models import db, Venue, Artist, Show, MAX_SHOW_DURATION, show_end
+from forms import existing_ids, INVALID_ARTIST, INVALID_VENUE, INVALID_TIME, INVALID_END
+
+
+#----------------------------------------------------------------------------#
+# Bulk show creation.
+#----------------------------------------------------------------------------#
+
+# A tour arrives as rows of artist_id, venue_id, start_time, and optionally
+# end_time or duration (minutes). All rows are checked with one IN query per
+# entity, then for overlaps with scheduling.find_conflicts() and, if every
+# row is valid, inserted with multi-row INSERTs; otherwise nothing is
+# inserted and each bad row is reported with the same messages ShowForm uses.
+
+FIELDS = ('artist_id', 'venue_id', 'start_time')
+INSERT_CHUNK = 1000
+
+class BulkError(ValueError):
+    pass
+
+
+def read_csv(text):
+    reader = csv.DictReader(io.StringIO(text.strip()))
+    if reader.fieldnames is None or not set(FIELDS) <= {name.strip() for name in reader.fieldnames}:
+        raise BulkError('CSV needs a header row with {}'.format(', '.join(FIELDS)))
+    return [{key.strip(): value for key, value in row.items() if key} for row in reader]
+
+def read_json(data):
+    rows = data.get('shows') if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise BulkError('Expected a list of shows, or {"shows": [...]}')
+    return rows
+
+def parse_id(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+def parse_time(value):
+    # The formats ShowForm accepts (YYYY-MM-DD HH:MM[:SS]) and ISO 8601.
+    try:
+        start_time = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    # start_time is stored without a zone.
+    return start_time if start_time.tzinfo is None else None
+
+def parse_end(row, start_time):
+    # end_time wins over duration; neither means SHOW_DURATION. None when
+    # the end is unreadable or not within MAX_SHOW_DURATION of the start.
+    if start_time is None:
+        return None
+    if row.get('end_time') not in (None, ''):
+        end_time = parse_time(row['end_time'])
+        if end_time is None or not timedelta(0) < end_time - start_time <= MAX_SHOW_DURATION:
+            return None
+        return end_time
+    if row.get('duration') not in (None, ''):
+        # Bounded before it becomes a timedelta, which overflows on huge values.
+        minutes = parse_id(row['duration'])
+        if minutes is None or not 0 < minutes <= MAX_SHOW_DURATION // timedelta(minutes=1):
+            return None
+        return show_end(start_time, timedelta(minutes=minutes))
+    return show_end(start_time)
+
+
+def validate_rows(rows):
+    # Returns (shows, errors): the parsed rows, and {'row': n, 'errors':
+    # {field: message}} for every invalid one (rows are numbered from 1).
+    parsed = []
+    for row in rows:
+        start_time = parse_time(row.get('start_time'))
+        parsed.append({
+            'artist_id': parse_id(row.get('artist_id')),
+            'venue_id': parse_id(row.get('venue_id')),
+            'start_time': start_time,
+            'end_time': parse_end(row, start_time),
+        })
+
+    artists = existing_ids(Artist, {row['artist_id'] for row in parsed if row['artist_id'] is not None})
+    venues = existing_ids(Venue, {row['venue_id'] for row in parsed if row['venue_id'] is not None})
+
+    errors = []
+    for number, row in enumerate(parsed, 1):
+        row_errors = {}
+        if row['artist_id'] not in artists:
+            row_errors['artist_id'] = INVALID_ARTIST
+        if row['venue_id'] not in venues:
+            row_errors['venue_id'] = INVALID_VENUE
+        if row['start_time'] is None:
+            row_errors['start_time'] = INVALID_TIME
+        elif row['end_time'] is None:
+            row_errors['end_time'] = INVALID_END
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+    return parsed, errors
+
+def insert_shows(shows):
+    for start in range(0, len(shows), INSERT_CHUNK):
+        db.session.execute(insert(Show).values(shows[start:start + INSERT_CHUNK]))
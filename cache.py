@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlencode
+from flask import request
+from markupsafe import Markup
+from metrics import cache_lookups
+from replicas import primary
+from dates import reader_locale
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LRUBackend:
+    # In-process LRU with per-entry TTL. The generation lives in a file when
+    # CACHE_DIR is set, so a write handled by one worker invalidates the
+    # caches of every worker on the box; otherwise it is a plain counter,
+    # which only this process sees.
+
+    def __init__(self, max_entries=1024, directory=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.generation_file = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.generation_file = os.path.join(directory, 'generation')
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def generation(self):
+        # The file's contents, not its mtime: two bumps within one tick of
+        # the filesystem clock would leave the mtime where it was.
+        if self.generation_file is None:
+            return self.counter
+        try:
+            with open(self.generation_file) as f:
+                return f.read()
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        if self.generation_file is None:
+            self.counter += 1
+            return
+        # A fresh uuid, renamed into place so readers see all of it or none.
+        temporary = '{}.{}'.format(self.generation_file, uuid.uuid4().hex)
+        with open(temporary, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(temporary, self.generation_file)
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisBackend:
+    # Any server speaking the Redis protocol; entries expire server-side and
+    # the generation is a shared INCR counter.
+
+    def __init__(self, url, prefix='fyyur:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND = "redis" requires the redis package')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def generation(self):
+        return int(self.client.get(self.prefix + 'generation') or 0)
+
+    def bump(self):
+        self.client.incr(self.prefix + 'generation')
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class PageCache:
+    # Caches the rendered listing fragment of a page, keyed by endpoint and
+    # query args. The layout around it (flashed messages, CSRF tokens) is
+    # per-user and is always rendered fresh.
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 300
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        backend = app.config.get('CACHE_BACKEND', 'lru')
+        if backend == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        elif backend == 'lru':
+            if not app.config.get('CACHE_DIR') and not (app.debug or app.testing):
+                app.logger.warning('CACHE_DIR is not set: with more than one worker process, a write '
+                    'only invalidates the listing cache of the worker that handled it')
+            self.backend = LRUBackend(
+                app.config.get('CACHE_MAX_ENTRIES', 1024),
+                app.config.get('CACHE_DIR'))
+        else:
+            self.backend = None
+
+    def key(self, endpoint, args):
+        # Every key embeds the current generation, so bumping it orphans all
+        # existing entries at once; the LRU or TTL reclaims them later. Dates
+        # are rendered in the reader's locale, so that is part of the key too.
+        return 'page:{}:{}:{}?{}'.format(
+            self.backend.generation(), reader_locale(), endpoint,
+            urlencode(sorted(args.items(multi=True))))
+
+    def fragment(self, render, ttl=None):
+        if self.backend is None:
+            return Markup(render())
+
+        key = self.key(request.endpoint, request.args)
+        value = self.backend.get(key)
+        if value is None:
+            cache_lookups.inc('miss')
+            # Fill from the primary: a lagging replica would otherwise park
+            # stale markup under the generation a write just started.
+            with primary():
+                value = render()
+            self.backend.set(key, value, ttl or self.ttl)
+        else:
+            cache_lookups.inc('hit')
+        return Markup(value)
+
+    def invalidate(self):
+        if self.backend is not None:
+            self.backend.bump()
+
+
+page_cache = PageCache()
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, make_response, request, session
+from sqlalchemy import func, select
+from models import db, Venue, Artist, Show
+from dates import reader_locale
+from assets import assets
+from partitions import partition_count
+
+
+#----------------------------------------------------------------------------#
+# Fingerprints.
+#----------------------------------------------------------------------------#
+
+# Each fingerprint is one statement returning the newest updated_at of every
+# row the page renders plus whatever an updated_at cannot show: row counts
+# (deletions) and, on detail pages, how many shows are still upcoming.
+# updated_at is set from clock_timestamp(), the time of the write itself:
+# now() is when the transaction began, so a long transaction committing
+# after a shorter, later one would not move MAX(updated_at).
+
+def newest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+def detail_fingerprint(model, id):
+    own_column, other = (Show.venue_id, Artist) if model is Venue else (Show.artist_id, Venue)
+    other_column = Show.artist_id if model is Venue else Show.venue_id
+
+    row = db.session.query(
+            func.max(model.updated_at),
+            func.max(Show.updated_at),
+            func.max(other.updated_at),
+            func.count(Show.id),
+            func.count(Show.id).filter(Show.start_time > datetime.now())
+        ) \
+        .select_from(model) \
+        .outerjoin(Show, own_column == model.id) \
+        .outerjoin(other, other.id == other_column) \
+        .filter(model.id == id) \
+        .one()
+
+    if row[0] is None:
+        # No such row: let the view answer its 404.
+        return None
+    return newest(*row[:3]), row[3:]
+
+def venue_fingerprint(venue_id):
+    return detail_fingerprint(Venue, venue_id)
+
+def artist_fingerprint(artist_id):
+    return detail_fingerprint(Artist, artist_id)
+
+def listing_fingerprint(*models, extra=()):
+    # Shows are removed through their venue, so the Venue count covers them
+    # on the /shows listing, or by archiving a month, which changes the
+    # number of Show partitions passed in extra.
+    columns = []
+    for model in models:
+        columns.append(select(func.max(model.updated_at)).scalar_subquery())
+    for model in models:
+        if model is not Show:
+            columns.append(select(func.count(model.id)).scalar_subquery())
+    columns.extend(extra)
+
+    row = db.session.query(*columns).one()
+    return newest(*row[:len(models)]), tuple(row[len(models):])
+
+def venues_fingerprint():
+    return listing_fingerprint(Venue)
+
+def artists_fingerprint():
+    return listing_fingerprint(Artist)
+
+def shows_fingerprint():
+    return listing_fingerprint(Show, Venue, Artist, extra=[partition_count()])
+
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+_release = None
+
+def release():
+    # Changes whenever a template or an asset bundle changes, so a deploy
+    # never gets a 304 for markup the client has not seen.
+    global _release
+    if _release is None:
+        digest = hashlib.sha1()
+        for root, dirs, files in sorted(os.walk(current_app.jinja_loader.searchpath[0])):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update('{}:{}'.format(path, os.stat(path).st_mtime_ns).encode())
+        digest.update(repr(sorted(assets.manifest['bundles'].items())).encode())
+        _release = digest.hexdigest()
+    return _release
+
+def session_part():
+    # Pages embed the session's CSRF token, which also expires; a client may
+    # only reuse a copy rendered for its own session and recent enough that
+    # the token is still good for half its lifetime.
+    field_name = current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')
+    time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    bucket = int(time.time() // (time_limit / 2)) if time_limit else 0
+    return '{}:{}'.format(session.get(field_name, ''), bucket)
+
+def make_etag(last_modified, parts):
+    digest = hashlib.sha1()
+    for part in (release(), request.full_path, session_part(), reader_locale(), last_modified, *parts):
+        digest.update(repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def conditional(fingerprint):
+    # Emits a strong ETag and Last-Modified for the page and answers 304 from
+    # the fingerprint alone when the client's copy is current. Last-Modified
+    # cannot see deletions, so only If-None-Match short-circuits the render.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if '_flashes' in session:
+                # Flashed messages are rendered once and must not be cached.
+                return view(*args, **kwargs)
+
+            state = fingerprint(*args, **kwargs)
+            if state is None:
+                return view(*args, **kwargs)
+
+            last_modified, parts = state
+            etag = make_etag(last_modified, parts)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            response.vary.add('Accept-Language')
+            return response
+        return wrapper
+    return decorator
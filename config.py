@@ -1,11 +1,7 @@
 import os
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
-
 # Connect to the database
 DB_HOST = os.getenv('DB_HOST', 'localhost:5432')
 DB_USER = os.getenv('DB_USER', 'postgres')
@@ -14,7 +10,162 @@ DB_NAME = os.getenv('DB_NAME', 'fyyur')
 
 DB_PATH = 'postgresql+psycopg2://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
 
-SQLALCHEMY_DATABASE_URI = DB_PATH
 
-SQLALCHEMY_TRACK_MODIFICATIONS = False
+class Config:
+    # Shared by every environment. Must be the same in every worker, or a
+    # form rendered by one worker fails CSRF validation in another.
+    SECRET_KEY = os.getenv('SECRET_KEY')
+
+    DEBUG = False
+    TESTING = False
+
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', DB_PATH)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool, per worker process: keep DB_POOL_SIZE at least the
+    # number of threads per worker. Connections are checked before use and
+    # replaced after DB_POOL_RECYCLE seconds; statements running longer than
+    # DB_STATEMENT_TIMEOUT milliseconds are cancelled by the server
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = 10
+    DB_POOL_RECYCLE = 1800
+    DB_POOL_PRE_PING = True
+    DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 5000))
+
+    # Read replicas for the views marked @read_only, chosen 'round_robin' or
+    # by 'least_connections'. After a write, that client reads from the
+    # primary for REPLICA_PIN_SECONDS so it sees its own changes
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_SELECTION = os.getenv('REPLICA_SELECTION', 'round_robin')
+    REPLICA_PIN_SECONDS = 5
+
+    # Shows are partitioned by month: partitions are kept this many months
+    # ahead, and `flask archive-shows` detaches months older than
+    # SHOW_ARCHIVE_AFTER_MONTHS
+    SHOW_PARTITIONS_AHEAD = 12
+    SHOW_ARCHIVE_AFTER_MONTHS = 24
+
+    # Listing pages
+    PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+
+    # Rows accepted by one bulk show submission
+    BULK_SHOWS_MAX_ROWS = 5000
+
+    # Rows fetched per round trip by the streaming exports
+    EXPORT_BATCH_SIZE = 1000
+
+    # Dates are formatted in the reader's locale (chosen in the layout's
+    # selector, else the best Accept-Language match among LOCALES)
+    LOCALES = ['en', 'fr', 'de', 'es']
+    DEFAULT_LOCALE = 'en'
+
+    # Static bundles (assets.py), built into static/dist under content-hashed
+    # names, at startup when a source is newer than the manifest or with
+    # `flask build-assets`. Hashed files are cached for ASSETS_MAX_AGE seconds
+    ASSETS_AUTO_BUILD = True
+    ASSETS_MAX_AGE = 365 * 24 * 3600
+
+    # Resized venue, artist and static/img images (images.py), rendered on
+    # first request and kept in IMAGE_CACHE_DIR. Originals larger than
+    # IMAGE_MAX_SOURCE_BYTES, slower than IMAGE_FETCH_TIMEOUT seconds to
+    # fetch, or not on a public http(s) address, are hot-linked instead; a
+    # failed fetch is not retried for IMAGE_FAILURE_TTL seconds. Originals are
+    # fetched again after IMAGE_SOURCE_MAX_AGE seconds, so a changed image at
+    # the same link is picked up
+    IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(basedir, 'image_cache'))
+    IMAGE_FETCH_TIMEOUT = 5
+    IMAGE_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+    IMAGE_FAILURE_TTL = 3600
+    IMAGE_SOURCE_MAX_AGE = 24 * 3600
+
+    # Compiled templates, shared by the workers on a box when
+    # TEMPLATE_CACHE_DIR is set; every template is compiled at startup
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR')
+    TEMPLATE_WARMUP = True
+
+    # Search results per query
+    SEARCH_LIMIT = 50
+
+    # Autocomplete suggestions per query, and how often (in seconds) each worker
+    # rebuilds its name index to pick up edits made through other workers
+    AUTOCOMPLETE_LIMIT = 10
+    AUTOCOMPLETE_REFRESH_INTERVAL = 300
+
+    # Listing fragment cache: 'lru' (in-process), 'redis' or 'none'. With
+    # several workers on one box, point CACHE_DIR at a shared directory so a
+    # write in one worker invalidates the others.
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'lru')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DIR = os.getenv('CACHE_DIR')
+    CACHE_DEFAULT_TTL = 300
+    CACHE_MAX_ENTRIES = 1024
+
+    # Per-request SQL instrumentation: statements a view may run before it is
+    # reported (or, under TESTING, fails), and how often one statement shape
+    # may repeat in a request before it is reported as a likely N+1 loop
+    SQL_INSTRUMENTATION = True
+    SQL_STATEMENT_BUDGET = 10
+    SQL_REPEAT_THRESHOLD = 5
+
+    # Prometheus metrics at /metrics. With several workers, point METRICS_DIR at
+    # a directory they share (cleared on restart) so any worker can answer a
+    # scrape with the totals of all of them
+    METRICS_ENABLED = True
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 5
+
+    # Logging: JSON lines written off the request thread to a size-rotated file
+    # (and stderr in debug mode). With several workers, include {pid} in
+    # LOG_FILE so each worker rotates its own file
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FILE = os.getenv('LOG_FILE', 'fyyur.log')
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_BATCH_SIZE = 100
+    LOG_FLUSH_INTERVAL = 1.0
+    LOG_QUEUE_SIZE = 10000
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    SECRET_KEY = os.getenv('SECRET_KEY', 'development-only-secret-key')
+    DB_POOL_SIZE = 2
+    DB_MAX_OVERFLOW = 2
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'testing-only-secret-key'
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', DB_PATH + '_test')
+    SQLALCHEMY_REPLICA_URIS = []
+    WTF_CSRF_ENABLED = False
+    CACHE_BACKEND = 'none'
+    METRICS_DIR = None
+    LOG_FILE = None
+
+
+class ProductionConfig(Config):
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'WARNING')
+
+
+config = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+    'default': DevelopmentConfig,
+}
 
+def engine_options(config):
+    # SQLALCHEMY_ENGINE_OPTIONS for the DB_* settings above. The schema
+    # (array columns, partitioned Show, exclusion constraints) needs
+    # PostgreSQL; no other database is supported.
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': {'options': '-c statement_timeout={}'.format(config['DB_STATEMENT_TIMEOUT'])},
+    }
@@ -0,0 +1,92 @@
+from collections import Counter
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Integer, column, func, values
+from models import db, Venue, Artist, Show
+from cache import page_cache
+
+
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.upcoming_shows_count and Artist.upcoming_shows_count are maintained
+# by the write paths below and corrected by refresh_upcoming_counts(), which
+# also catches shows that have since started and are no longer upcoming.
+SHOW_COLUMN = {
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+def upcoming_shows(model):
+    # The one place listings and search read the upcoming show count from.
+    return model.upcoming_shows_count
+
+def adjust(model, id, delta):
+    db.session.query(model) \
+        .filter(model.id == id) \
+        .update({model.upcoming_shows_count: model.upcoming_shows_count + delta},
+            synchronize_session=False)
+
+def show_created(venue_id, artist_id, start_time, now=None):
+    if start_time > (now or datetime.now()):
+        adjust(Venue, venue_id, 1)
+        adjust(Artist, artist_id, 1)
+
+def shows_created(shows, now=None):
+    # Bulk form of show_created(): one UPDATE ... FROM (VALUES ...) per table.
+    now = now or datetime.now()
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        deltas = Counter(show[key] for show in shows if show['start_time'] > now)
+        if not deltas:
+            continue
+        rows = values(column('id', Integer), column('delta', Integer), name='deltas') \
+            .data(list(deltas.items()))
+        db.session.query(model) \
+            .filter(model.id == rows.c.id) \
+            .update({model.upcoming_shows_count: model.upcoming_shows_count + rows.c.delta},
+                synchronize_session=False)
+
+def entity_deleted(model, id, now=None):
+    # Deleting a venue cascades to its shows, so every artist booked there
+    # loses those upcoming shows (and the other way round). Run before the
+    # delete, in the same transaction.
+    now = now or datetime.now()
+    own_column = SHOW_COLUMN[model]
+    other = Artist if model is Venue else Venue
+    other_column = SHOW_COLUMN[other]
+
+    lost = db.session.query(other_column.label('id'), func.count(Show.id).label('count')) \
+        .filter(own_column == id, Show.start_time > now) \
+        .group_by(other_column) \
+        .subquery()
+
+    db.session.query(other) \
+        .filter(other.id == lost.c.id) \
+        .update({other.upcoming_shows_count: other.upcoming_shows_count - lost.c.count},
+            synchronize_session=False)
+
+def refresh_upcoming_counts(now=None):
+    # One UPDATE per table that only rewrites rows whose count drifted.
+    now = now or datetime.now()
+    changed = 0
+    for model, column in SHOW_COLUMN.items():
+        actual = db.session.query(func.count(Show.id)) \
+            .filter(column == model.id, Show.start_time > now) \
+            .correlate(model) \
+            .scalar_subquery()
+        changed += db.session.query(model) \
+            .filter(model.upcoming_shows_count != actual) \
+            .update({model.upcoming_shows_count: actual}, synchronize_session=False)
+    db.session.commit()
+    return changed
+
+@click.command('refresh-counters')
+@with_appcontext
+def refresh_counters_command():
+    """Recompute upcoming show counters; run periodically (e.g. from cron)."""
+    changed = refresh_upcoming_counts()
+    if changed:
+        page_cache.invalidate()
+    click.echo('{} counters updated.'.format(changed))
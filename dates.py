@@ -0,0 +1,64 @@
+from datetime import datetime
+from functools import lru_cache
+import babel
+import babel.dates
+import dateutil.parser
+from flask import current_app, g, has_request_context, request, session
+
+
+#----------------------------------------------------------------------------#
+# Formatting.
+#----------------------------------------------------------------------------#
+
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=None)
+def compiled_pattern(format):
+    # Named formats or any Babel pattern, parsed once.
+    return babel.dates.parse_pattern(PATTERNS.get(format, format))
+
+@lru_cache(maxsize=None)
+def locale(identifier):
+    return babel.Locale.parse(identifier)
+
+@lru_cache(maxsize=4096)
+def parse(value):
+    return dateutil.parser.parse(value)
+
+@lru_cache(maxsize=16384)
+def format_cached(value, format, locale_identifier):
+    # Show.start_time is a naive wall-clock time at the venue, with no zone
+    # to convert from, so it is shown as it is to every reader.
+    return compiled_pattern(format).apply(value, locale(locale_identifier))
+
+
+#----------------------------------------------------------------------------#
+# Reader preferences.
+#----------------------------------------------------------------------------#
+
+def reader_locale():
+    # The current reader's locale: their saved choice, else the best
+    # Accept-Language match, else DEFAULT_LOCALE.
+    if not has_request_context():
+        return current_app.config['DEFAULT_LOCALE']
+    if 'reader_locale' not in g:
+        locales = current_app.config['LOCALES']
+        chosen = session.get('locale')
+        if chosen not in locales:
+            chosen = request.accept_languages.best_match(locales) or current_app.config['DEFAULT_LOCALE']
+        g.reader_locale = chosen
+    return g.reader_locale
+
+def locale_choices():
+    # [(identifier, name in that language)] for the selector in the layout.
+    return [(identifier, locale(identifier).display_name.capitalize())
+        for identifier in current_app.config['LOCALES']]
+
+
+def format_datetime(value, format='medium'):
+    if not isinstance(value, datetime):
+        value = parse(value)
+    return format_cached(value, format, reader_locale())
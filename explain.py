@@ -0,0 +1,83 @@
+import re
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from models import db, Venue, Artist, Show
+from queries import venue_areas_query, artists_page_query, shows_page_query
+from search import search_query
+from viewmodels import detail_query, show_tiles_query, VenueDetail, ArtistDetail
+from partitions import PARENT
+
+
+#----------------------------------------------------------------------------#
+# Query plan checks.
+#----------------------------------------------------------------------------#
+
+# (view, query, indexes any of which the plan is expected to use). Each
+# query comes from the builder its view runs, with a typical page cursor.
+EXPLAIN_CHECKS = [
+    ('venues', lambda now: venue_areas_query(('CA', 'San Francisco', 'M', 1), 20),
+        ('ix_Venue_area',)),
+    ('show_venue', lambda now: detail_query(Venue, VenueDetail, 1),
+        ('Venue_pkey',)),
+    ('show_venue shows', lambda now: show_tiles_query(Show.venue_id == 1),
+        ('ix_Show_venue_id_start_time',)),
+    ('show_artist', lambda now: detail_query(Artist, ArtistDetail, 1),
+        ('Artist_pkey',)),
+    ('show_artist shows', lambda now: show_tiles_query(Show.artist_id == 1),
+        ('ix_Show_artist_id_start_time',)),
+    ('artists', lambda now: artists_page_query(('M', 1), 20),
+        ('ix_Artist_name_id',)),
+    ('shows', lambda now: shows_page_query((now, 1), 20),
+        ('ix_Show_start_time',)),
+    ('search_venues', lambda now: search_query(Venue, 'jazz', 50),
+        ('ix_Venue_name_trgm',)),
+    ('search_artists', lambda now: search_query(Artist, 'jazz', 50),
+        ('ix_Artist_name_trgm',)),
+]
+
+def index_pattern(index):
+    # Each partition of "Show" has its own copy of the parent's indexes,
+    # which PostgreSQL names after the partition and the columns.
+    names = [re.escape(index)]
+    for table_index in Show.__table__.indexes:
+        if table_index.name == index:
+            names.append(r'{}_(?:p\d{{4}}_\d{{2}}|default)_{}_idx'.format(
+                re.escape(PARENT), '_'.join(column.name for column in table_index.columns)))
+    return re.compile(r'\b(?:{})\b'.format('|'.join(names)))
+
+def explain(query):
+    # Sequential scans are disabled for the check: on a small or freshly
+    # seeded table the planner would rightly prefer them, and what we want to
+    # know is whether an index exists that can serve the query.
+    statement = query.statement.compile(dialect=db.engine.dialect)
+    connection = db.session.connection()
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = connection.exec_driver_sql('EXPLAIN ' + str(statement), statement.params)
+    return '\n'.join(row[0] for row in rows)
+
+def check_query_plans(now=None):
+    now = now or datetime.now()
+    results = []
+    try:
+        for view, build, indexes in EXPLAIN_CHECKS:
+            plan = explain(build(now))
+            used = [index for index in indexes if index_pattern(index).search(plan)]
+            results.append((view, used[0] if used else indexes[0], bool(used), plan))
+    finally:
+        db.session.rollback()
+    return results
+
+@click.command('explain')
+@click.option('--verbose', '-v', is_flag=True, help='Print the full plans.')
+@with_appcontext
+def explain_command(verbose):
+    """Check that each view's query is planned with its index."""
+    failed = False
+    for view, index, used, plan in check_query_plans():
+        click.echo('{:<18} {:<32} {}'.format(view, index, 'ok' if used else 'NOT USED'))
+        if verbose or not used:
+            click.echo(plan)
+        failed = failed or not used
+    if failed:
+        raise click.ClickException('Some queries are not using their index.')
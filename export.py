@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+import click
+from flask.cli import with_appcontext
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Streaming export.
+#----------------------------------------------------------------------------#
+
+# Rows are fetched through a server-side cursor EXPORT_BATCH_SIZE at a time
+# and serialized into chunks of about CHUNK_SIZE bytes, so memory use stays
+# flat whatever the size of the table.
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 64 * 1024
+
+def columns(model):
+    return [column for column in model.__table__.columns]
+
+def export_rows(model, batch_size=1000):
+    query = db.session.query(*columns(model)).order_by(model.id).yield_per(batch_size)
+    for row in query:
+        yield row
+
+def csv_value(value):
+    if isinstance(value, list):
+        return ';'.join(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(type(value))
+
+def serialize(model, format, rows):
+    # Yields text chunks: a header row first for CSV, one object per line
+    # for NDJSON.
+    names = [column.name for column in columns(model)]
+    buffer = io.StringIO()
+
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        write = lambda row: writer.writerow([csv_value(value) for value in row])
+    else:
+        write = lambda row: buffer.write(json.dumps(dict(zip(names, row)), default=json_value) + '\n')
+
+    for row in rows:
+        write(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def encode(chunks, compress=False):
+    # UTF-8 bytes, gzipped on the fly when asked to.
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode()
+        return
+
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export(kind, format, compress=False, batch_size=1000):
+    model = MODELS[kind]
+    return encode(serialize(model, format, export_rows(model, batch_size)), compress)
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(MODELS)))
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='File to write (default: stdout).')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Rows fetched per round trip.')
+@with_appcontext
+def export_command(kind, format, compress, output, batch_size):
+    """Stream every venue, artist or show as CSV or NDJSON."""
+    for data in export(kind, format, compress, batch_size):
+        output.write(data)
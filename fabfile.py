@@ -13,6 +13,10 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench():
+    local("python -m benchmarks run --no-cache")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
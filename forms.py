@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, InputRequired, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, InputRequired, ValidationError, Optional, NumberRange
 import re
 from enums import Genre, State
 from models import *
@@ -24,15 +24,24 @@ def validate_state(form, field):
     if field.data not in dict(State.choices()).keys():
         raise ValidationError("Invalid State")
 
+INVALID_ARTIST = "Invalid Artist Id"
+INVALID_VENUE = "Invalid Venue Id"
+INVALID_TIME = "Please enter valid time"
+INVALID_END = "A show ends after it starts, within a day"
+
+def existing_ids(model, ids):
+    # The subset of ids that exist, in one IN query.
+    if not ids:
+        return set()
+    return {id for id, in db.session.query(model.id).filter(model.id.in_(ids))}
+
 def validate_artist_id(form, field):
-    artist = db.session.query(Artist.id).filter_by(id = field.data).first()
-    if artist is None:
-        raise ValidationError("Invalid Artist Id")
+    if not field.data.isdecimal() or not existing_ids(Artist, {int(field.data)}):
+        raise ValidationError(INVALID_ARTIST)
 
 def validate_venue_id(form, field):
-    venue = db.session.query(Venue.id).filter_by(id = field.data).first()
-    if venue is None:
-        raise ValidationError("Invalid Venue Id")
+    if not field.data.isdecimal() or not existing_ids(Venue, {int(field.data)}):
+        raise ValidationError(INVALID_VENUE)
 
 
 
@@ -49,9 +58,20 @@ class ShowForm(FlaskForm):
     )
     start_time = DateTimeField(
         'start_time',
-        validators=[DataRequired(message=('Please enter valid time'))],
+        validators=[DataRequired(message=INVALID_TIME)],
         default= datetime.today()
     )
+    # Minutes; left empty, the show runs for SHOW_DURATION.
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=MAX_SHOW_DURATION // timedelta(minutes=1), message=INVALID_END)]
+    )
+
+    def end_time(self):
+        # None when the show would end past the last representable time.
+        if self.duration.data:
+            return show_end(self.start_time.data, timedelta(minutes=self.duration.data))
+        return show_end(self.start_time.data)
 
 
 class VenueForm(FlaskForm):
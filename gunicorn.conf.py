@@ -0,0 +1,60 @@
+import glob
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Workers are processes (one per core scales CPU-bound rendering), threads
+# overlap database waits within a worker. Keep DB_POOL_SIZE at least
+# `threads`, and workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the
+# server's max_connections.
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app once in the master so workers fork with it loaded.
+preload_app = True
+
+# Recycle workers now and then to bound memory growth; the jitter keeps them
+# from all restarting at once.
+max_requests = 5000
+max_requests_jitter = 500
+
+# Shared state for the workers on this box: listing cache generation,
+# metrics snapshots, compiled templates, and one log file per worker.
+run_dir = os.getenv('FYYUR_RUN_DIR', '/tmp/fyyur')
+os.environ.setdefault('CACHE_DIR', os.path.join(run_dir, 'cache'))
+os.environ.setdefault('METRICS_DIR', os.path.join(run_dir, 'metrics'))
+os.environ.setdefault('TEMPLATE_CACHE_DIR', os.path.join(run_dir, 'templates'))
+os.environ.setdefault('LOG_FILE', os.path.join(run_dir, 'fyyur.{pid}.log'))
+
+accesslog = '-'
+
+
+def on_starting(server):
+    # Snapshots of the previous run's workers would otherwise be summed in.
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
+
+
+def when_ready(server):
+    # With the app preloaded in the master: create the coming months' Show
+    # partitions on every deploy (cron keeps them going in between), then
+    # close any connection this opened, so no worker inherits a socket
+    # another process is also using.
+    if not server.cfg.preload_app:
+        return
+    from models import db
+    from partitions import ensure_partitions, is_partitioned
+    app = server.app.wsgi()
+    with app.app_context():
+        with db.engine.begin() as connection:
+            if is_partitioned(connection):
+                ensure_partitions(connection, app.config['SHOW_PARTITIONS_AHEAD'])
+        db.engine.dispose()
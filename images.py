@@ -0,0 +1,371 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from functools import lru_cache
+import click
+from flask import abort, current_app, redirect, request, send_file
+from flask.cli import with_appcontext
+from PIL import Image, ImageOps
+from models import db, Venue, Artist
+
+try:
+    # AVIF for Pillow releases without it built in.
+    import pillow_avif
+except ImportError:
+    pass
+
+
+#----------------------------------------------------------------------------#
+# Derivatives.
+#----------------------------------------------------------------------------#
+
+# Every image is served as resized copies at a few fixed widths, in AVIF and
+# WebP for browsers that take them and progressive JPEG for the rest. Copies
+# are made on first request and kept on disk under the source's version, the
+# hash of its contents. The version is part of the URL, so a copy can be
+# cached for good. A venue or artist original is fetched again once older
+# than IMAGE_SOURCE_MAX_AGE, so a new image at the same link gets new URLs;
+# until it has been fetched, its URLs carry the hash of the link instead,
+# and redirect to the copy named after the contents.
+
+WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 50, 'speed': 6}),
+    'webp': ('WEBP', 'image/webp', {'quality': 75, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+}
+
+def supported_formats():
+    # Best first; the last one is the <img> fallback every browser reads.
+    Image.init()
+    return [name for name, (plugin, mimetype, options) in FORMATS.items() if plugin in Image.SAVE]
+
+@lru_cache(maxsize=4096)
+def link_version(link):
+    return hashlib.sha256(link.encode()).hexdigest()[:16]
+
+@lru_cache(maxsize=64)
+def file_version(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def render(data, width, format):
+    # Never scales up: a source narrower than width is only re-encoded.
+    plugin, mimetype, options = FORMATS[format]
+    image = Image.open(io.BytesIO(data))
+    # JPEGs decode straight to a smaller scale, as long as both sides stay
+    # at least width (either may end up horizontal once rotated).
+    image.draft('RGB', (width, width))
+    image = ImageOps.exif_transpose(image)
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+    if plugin == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    output = io.BytesIO()
+    image.save(output, plugin, **options)
+    return output.getvalue()
+
+
+#----------------------------------------------------------------------------#
+# Fetching.
+#----------------------------------------------------------------------------#
+
+# image_link is whatever a user typed, so the server only fetches it from
+# public addresses over http or https: no file:// or other schemes, no
+# loopback, private, link-local or otherwise non-global hosts, including
+# after a redirect. The check is made on the address actually connected
+# to, so a name that resolves differently the second time (DNS rebinding)
+# gains nothing. Proxies from the environment are not used.
+
+SCHEMES = ('http', 'https')
+
+class UnsafeLink(ValueError):
+    pass
+
+def check_scheme(url):
+    if urllib.parse.urlsplit(url).scheme.lower() not in SCHEMES:
+        raise UnsafeLink('Only http and https images are fetched: {}'.format(url))
+
+def public_address(address):
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    # socket.create_connection(), refusing a host with any non-public address.
+    host, port = address
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    if not addresses or not all(public_address(sockaddr[0]) for family, type, proto, name, sockaddr in addresses):
+        raise UnsafeLink('Not a public address: {}'.format(host))
+    family, type, proto, name, sockaddr = addresses[0]
+    sock = socket.socket(family, type, proto)
+    try:
+        if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            sock.settimeout(timeout)
+        sock.connect(sockaddr)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connection
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connection
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+class PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    max_redirections = 5
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_scheme(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+def public_opener():
+    opener = urllib.request.OpenerDirector()
+    for handler in (PublicHTTPHandler(), PublicHTTPSHandler(), PublicRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+        opener.add_handler(handler)
+    return opener
+
+opener = public_opener()
+
+
+class Images:
+
+    def __init__(self):
+        self.directory = None
+        self.formats = []
+
+    def init_app(self, app):
+        self.directory = app.config.get('IMAGE_CACHE_DIR')
+        self.fetch_timeout = app.config.get('IMAGE_FETCH_TIMEOUT', 5)
+        self.max_source_bytes = app.config.get('IMAGE_MAX_SOURCE_BYTES', 10 * 1024 * 1024)
+        self.failure_ttl = app.config.get('IMAGE_FAILURE_TTL', 3600)
+        self.source_max_age = app.config.get('IMAGE_SOURCE_MAX_AGE', 24 * 3600)
+        self.max_age = app.config.get('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        self.formats = supported_formats()
+        app.add_url_rule('/images/<kind>/<key>/<version>/<int:width>.<format>', 'image', self.send)
+        app.jinja_env.globals['image_sources'] = self.sources
+
+    # Sources.
+
+    def static_path(self, key):
+        # Only files directly under static/img.
+        if os.path.basename(key) != key:
+            return None
+        path = os.path.join(current_app.static_folder, 'img', key)
+        return path if os.path.isfile(path) else None
+
+    def link(self, kind, key):
+        model = MODELS.get(kind)
+        if model is None or not key.isdecimal():
+            return None
+        return db.session.query(model.image_link).filter(model.id == int(key)).scalar()
+
+    def version(self, kind, key, link=None):
+        if kind == 'static':
+            path = self.static_path(key)
+            return path and file_version(path, os.stat(path).st_mtime_ns)
+        if not link:
+            return None
+        # A stale original is still used while fetching it again fails.
+        path = self.source_path(link)
+        if self.fresh(path) or self.failed(link_version(link)):
+            return self.content_version(path) or link_version(link)
+        return link_version(link)
+
+    def source_path(self, link):
+        return os.path.join(self.directory, 'sources', link_version(link))
+
+    def content_version(self, path):
+        # None until the original has been fetched.
+        try:
+            return file_version(path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def fresh(self, path):
+        try:
+            return time.time() - os.stat(path).st_mtime < self.source_max_age
+        except FileNotFoundError:
+            return False
+
+    def failure_path(self, version):
+        return os.path.join(self.directory, 'sources', version + '.failed')
+
+    def failed(self, version):
+        # Whether fetching the original failed within IMAGE_FAILURE_TTL.
+        try:
+            return time.time() - os.stat(self.failure_path(version)).st_mtime < self.failure_ttl
+        except FileNotFoundError:
+            return False
+
+    def fetch(self, link):
+        # Remote originals are kept next to their derivatives, so adding a
+        # width or format later does not fetch them again until they are
+        # IMAGE_SOURCE_MAX_AGE old. A failure is remembered for
+        # IMAGE_FAILURE_TTL, so a dead host does not hold a worker for every
+        # width and format of every page view. Returns the content version.
+        path = self.source_path(link)
+        if self.fresh(path):
+            return self.content_version(path)
+        if self.failed(link_version(link)):
+            raise ValueError('Fetching the image failed recently')
+        try:
+            check_scheme(link)
+            remote = urllib.request.Request(link, headers={'User-Agent': 'Fyyur image resizer'})
+            with opener.open(remote, timeout=self.fetch_timeout) as response:
+                data = response.read(self.max_source_bytes + 1)
+            if len(data) > self.max_source_bytes:
+                raise ValueError('Image larger than IMAGE_MAX_SOURCE_BYTES')
+        except (OSError, ValueError, http.client.HTTPException) as error:
+            write(self.failure_path(link_version(link)), str(error).encode())
+            raise
+        write(path, data)
+        return self.content_version(path)
+
+    def source(self, kind, key, version):
+        # The original bytes for a derivative URL, or None when it no longer
+        # names a current image.
+        if kind == 'static':
+            path = self.static_path(key)
+        else:
+            link = self.link(kind, key)
+            path = link and self.source_path(link)
+        if not path or self.content_version(path) != version:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    # Derivatives.
+
+    def path(self, version, width, format):
+        return os.path.join(self.directory, version[:2], version, '{}.{}'.format(width, format))
+
+    def derivative(self, kind, key, version, width, format):
+        path = self.path(version, width, format)
+        if not os.path.exists(path):
+            data = self.source(kind, key, version)
+            if data is None:
+                return None
+            # Two workers may both render a missing copy; the rename makes
+            # whichever finishes last win with identical bytes.
+            write(path, render(data, width, format))
+        return path
+
+    def send(self, kind, key, version, width, format):
+        if width not in WIDTHS or format not in self.formats or (kind != 'static' and kind not in MODELS):
+            abort(404)
+        try:
+            link = kind != 'static' and self.link(kind, key)
+            if link and version == link_version(link):
+                # Markup from before the original was (re)fetched.
+                return redirect(self.url(kind, key, self.fetch(link), width, format))
+            path = self.derivative(kind, key, version, width, format)
+        except (OSError, ValueError, http.client.HTTPException, Image.DecompressionBombError):
+            # Unreachable or unreadable originals are hot-linked as before.
+            current_app.logger.warning('image', exc_info=True, extra={'fields': {'kind': kind, 'key': key}})
+            link = self.link(kind, key)
+            if link:
+                return redirect(link)
+            abort(404)
+        if path is None:
+            abort(404)
+
+        response = send_file(path, mimetype=FORMATS[format][1], max_age=self.max_age)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    # Markup.
+
+    def url(self, kind, key, version, width, format):
+        return '{}/images/{}/{}/{}/{}.{}'.format(request.script_root, kind, key, version, width, format)
+
+    def sources(self, kind, key, link=None, widths=(320, 640, 960)):
+        # [(mimetype, srcset, src)] best format first, for the
+        # responsive_image macro; empty when there is nothing to resize.
+        key = str(key)
+        version = self.version(kind, key, link)
+        if not version or (kind != 'static' and (not link.startswith(('http://', 'https://')) or self.failed(version))):
+            # The macro then hot-links the original.
+            return []
+        url = lambda width, format: self.url(kind, key, version, width, format)
+        return [(
+            FORMATS[format][1],
+            ', '.join('{} {}w'.format(url(width, format), width) for width in widths),
+            url(widths[len(widths) // 2], format),
+        ) for format in self.formats]
+
+
+images = Images()
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+@click.command('warm-images')
+@click.option('--width', 'widths', type=click.Choice([str(width) for width in WIDTHS]), multiple=True,
+    help='Widths to render (default: all).')
+@with_appcontext
+def warm_images_command(widths):
+    """Render every venue, artist and static/img derivative ahead of traffic."""
+    widths = [int(width) for width in widths] or WIDTHS
+    targets = [('static', name, None) for name in sorted(os.listdir(os.path.join(current_app.static_folder, 'img')))
+        if not name.startswith('.')]
+    for kind, model in MODELS.items():
+        targets += [(kind, str(id), link) for id, link in
+            db.session.query(model.id, model.image_link).filter(model.image_link.isnot(None)).order_by(model.id)]
+
+    rendered = failed = 0
+    for kind, key, link in targets:
+        try:
+            version = images.fetch(link) if link else images.version(kind, key)
+            if not version:
+                continue
+            for width in widths:
+                for format in images.formats:
+                    images.derivative(kind, key, version, width, format)
+                    rendered += 1
+        except (OSError, ValueError, http.client.HTTPException, Image.DecompressionBombError) as error:
+            click.echo('{} {}: {}'.format(kind, key, error), err=True)
+            failed += 1
+    click.echo('{} derivatives ready, {} sources failed.'.format(rendered, failed))
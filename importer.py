@@ -0,0 +1,324 @@
+import csv
+import io
+import json
+import os
+import time
+from functools import lru_cache
+from itertools import islice
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from werkzeug.datastructures import MultiDict
+from models import db, Venue, Artist, Show
+from forms import VenueForm, ArtistForm
+from enums import Genre, State
+from cache import page_cache
+from counters import refresh_upcoming_counts
+import bulk
+import scheduling
+
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+# Input is CSV (list columns such as genres separated by ';', as written by
+# `flask export`) or NDJSON, one object per line.
+
+def read_rows(path, format):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if format == 'csv':
+            for row in csv.DictReader(f):
+                yield {key.strip(): value for key, value in row.items() if key}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in str(value).split(';') if item.strip()]
+
+def as_flag(value):
+    return str(value).strip().lower() in ('1', 'true', 't', 'yes', 'y', 'on')
+
+
+#----------------------------------------------------------------------------#
+# Validation.
+#----------------------------------------------------------------------------#
+
+# Venues and artists go through the same form classes as the web UI, fed
+# from the row instead of a request. Enum values ('Hip-Hop') are mapped to
+# the names the forms submit ('Hip_Hop').
+
+GENRE_NAMES = {**{genre.value: genre.name for genre in Genre}, **{genre.name: genre.name for genre in Genre}}
+STATE_NAMES = {**{state.value: state.name for state in State}, **{state.name: state.name for state in State}}
+
+# Form field -> model column, where they differ.
+RENAMED = {'website_link': 'website'}
+
+@lru_cache(maxsize=None)
+def field_names(form_class):
+    return tuple(form_class(formdata=None, meta={'csrf': False})._fields)
+
+def form_record(form_class, row):
+    formdata = MultiDict()
+    for name in field_names(form_class):
+        column = RENAMED.get(name, name)
+        value = row.get(name, row.get(column))
+        if name == 'genres':
+            for genre in as_list(value):
+                formdata.add(name, GENRE_NAMES.get(genre, genre))
+        elif name == 'state':
+            formdata.add(name, STATE_NAMES.get(value, value))
+        elif name.startswith('seeking_') and name != 'seeking_description':
+            if as_flag(value):
+                formdata.add(name, 'y')
+        elif value is not None:
+            formdata.add(name, str(value))
+
+    form = form_class(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, {name: ' '.join(map(str, messages)) for name, messages in form.errors.items()}
+
+    record = {RENAMED.get(name, name): field.data for name, field in form._fields.items()}
+    return record, None
+
+def with_id(record, row):
+    # Rows that carry an id update that row; others are inserted.
+    # Parsed like the show ids, so 12.7 in NDJSON is an error, not row 12.
+    value = row.get('id')
+    if value not in (None, ''):
+        record['id'] = bulk.parse_id(value)
+        if record['id'] is None:
+            raise ValueError(value)
+    return record
+
+
+def validate_form_chunk(form_class):
+    def validate(rows):
+        records, errors = [], []
+        for number, row in rows:
+            try:
+                record, row_errors = form_record(form_class, row)
+                if record is not None:
+                    record = with_id(record, row)
+            except ValueError:
+                record, row_errors = None, {'id': 'Invalid id'}
+            if record is None:
+                errors.append({'row': number, 'errors': row_errors})
+            else:
+                records.append(record)
+        return records, errors
+    return validate
+
+def validate_show_chunk(rows):
+    # Artist and venue ids are checked with one IN query per chunk.
+    shows, errors = bulk.validate_rows([row for number, row in rows])
+    invalid = {error['row'] for error in errors}
+    records, indexes = [], []
+    for index, ((number, row), show) in enumerate(zip(rows, shows), 1):
+        if index in invalid:
+            continue
+        try:
+            records.append(with_id(show, row))
+            indexes.append(index)
+        except ValueError:
+            invalid.add(index)
+            errors.append({'row': index, 'errors': {'id': 'Invalid id'}})
+
+    # Shows overlapping one already booked, or an earlier one in the chunk,
+    # are left out.
+    conflicts = scheduling.find_conflicts(records)
+    for conflict in conflicts:
+        conflict['row'] = indexes[conflict['row'] - 1]
+    clashing = {conflict['row'] for conflict in conflicts}
+    records = [record for index, record in zip(indexes, records) if index not in clashing]
+    errors += conflicts
+    for error in errors:
+        error['row'] = rows[error['row'] - 1][0]
+    return records, errors
+
+
+KINDS = {
+    'venues': (Venue, validate_form_chunk(VenueForm)),
+    'artists': (Artist, validate_form_chunk(ArtistForm)),
+    'shows': (Show, validate_show_chunk),
+}
+
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+def dedupe(records):
+    # An upsert cannot touch one row twice in a statement; the last wins.
+    by_id, rest = {}, []
+    for record in records:
+        if 'id' in record:
+            by_id[record['id']] = record
+        else:
+            rest.append(record)
+    return list(by_id.values()) + rest
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, list):
+        return '{' + ','.join('"{}"'.format(item.replace('\\', '\\\\').replace('"', '\\"')) for item in value) + '}'
+    return value
+
+def key_columns(table):
+    return [column.name for column in table.primary_key]
+
+def load(model, records):
+    # COPY the chunk into a temporary table shaped like the target, then
+    # upsert from it in one statement.
+    table = model.__table__
+    key = key_columns(table)
+    with_ids = [record for record in records if 'id' in record]
+    new = [record for record in records if 'id' not in record]
+    connection = db.session.connection()
+    staging = 'import_{}'.format(table.name.lower())
+    connection.exec_driver_sql(
+        'CREATE TEMPORARY TABLE IF NOT EXISTS {} (LIKE "{}" INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+        .format(staging, table.name))
+
+    for batch, has_id in ((with_ids, True), (new, False)):
+        if not batch:
+            continue
+        names = [name for name in batch[0] if name != 'id'] + (['id'] if has_id else [])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in batch:
+            writer.writerow([copy_value(record.get(name)) for name in names])
+        buffer.seek(0)
+
+        column_list = ', '.join('"{}"'.format(name) for name in names)
+        cursor = connection.connection.cursor()
+        cursor.execute('TRUNCATE {}'.format(staging))
+        cursor.copy_expert("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(staging, column_list), buffer)
+        statement = 'INSERT INTO "{}" ({columns}) SELECT {columns} FROM {}'.format(
+            table.name, staging, columns=column_list)
+        if has_id and key != ['id']:
+            # Show's key is (id, start_time), as it is partitioned by
+            # start_time: a row whose start_time changed is removed first,
+            # or the upsert would keep both.
+            connection.exec_driver_sql(
+                'DELETE FROM "{0}" USING {1} WHERE "{0}".id = {1}.id AND ({2})'.format(
+                    table.name, staging, ' OR '.join(
+                        '"{0}"."{2}" IS DISTINCT FROM {1}."{2}"'.format(table.name, staging, name)
+                        for name in key if name != 'id')))
+        if has_id:
+            # updated_at moves like any other write, or the conditional GET
+            # fingerprints would not notice the re-imported rows.
+            statement += ' ON CONFLICT ({}) DO UPDATE SET '.format(', '.join('"{}"'.format(name) for name in key)) + \
+                ', '.join(['"{0}" = EXCLUDED."{0}"'.format(name) for name in names if name not in key] +
+                    ['"updated_at" = clock_timestamp()'])
+        connection.exec_driver_sql(statement)
+
+def reset_sequence(model):
+    # Explicit ids bypass the id sequence; move it past them.
+    table = model.__table__.name
+    db.session.execute(text(
+        "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+        "(SELECT coalesce(max(id), 0) + 1 FROM \"{}\"), false)".format(table)),
+        {'table': '"{}"'.format(table)})
+
+
+#----------------------------------------------------------------------------#
+# Checkpoints.
+#----------------------------------------------------------------------------#
+
+# After every committed chunk the number of input rows handled so far is
+# written next to the input, so an interrupted import can --resume. Rows
+# are upserted, so redoing part of a chunk is harmless.
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_checkpoint(path, state):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, path)
+
+
+#----------------------------------------------------------------------------#
+# Command.
+#----------------------------------------------------------------------------#
+
+def chunks(rows, size, start=0):
+    numbered = islice(enumerate(rows, 1), start, None)
+    while True:
+        chunk = list(islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+def run_import(kind, path, format, chunk_size=5000, resume=False, errors_file=None, echo=click.echo):
+    model, validate = KINDS[kind]
+    checkpoint = path + '.checkpoint'
+    state = {'kind': kind, 'rows': 0, 'loaded': 0, 'rejected': 0}
+    if resume:
+        saved = read_checkpoint(checkpoint)
+        if saved and saved.get('kind') == kind:
+            state = saved
+            echo('Resuming after row {}.'.format(state['rows']))
+
+    started = time.monotonic()
+    done_at_start = state['rows']
+    for chunk in chunks(read_rows(path, format), chunk_size, state['rows']):
+        records, errors = validate(chunk)
+        if records:
+            load(model, dedupe(records))
+        db.session.commit()
+
+        for error in errors:
+            if errors_file:
+                errors_file.write(json.dumps(error) + '\n')
+        state['rows'] = chunk[-1][0]
+        state['loaded'] += len(records)
+        state['rejected'] += len(errors)
+        write_checkpoint(checkpoint, state)
+
+        elapsed = time.monotonic() - started
+        echo('{rows} rows: {loaded} loaded, {rejected} rejected ({rate:.0f} rows/s)'.format(
+            rate=(state['rows'] - done_at_start) / elapsed if elapsed else 0, **state))
+
+    reset_sequence(model)
+    db.session.commit()
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return state
+
+def refresh_after_import(kind):
+    # Counters and the listing cache; each worker's autocomplete index
+    # picks up new names on its next periodic rebuild.
+    if kind == 'shows':
+        refresh_upcoming_counts()
+    page_cache.invalidate()
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+    help='Input format (default: from the file extension).')
+@click.option('--chunk-size', type=int, default=5000, show_default=True, help='Rows validated and committed together.')
+@click.option('--resume', is_flag=True, help='Continue from the checkpoint of an interrupted import.')
+@click.option('--errors', 'errors_file', type=click.File('w'), help='Write rejected rows here as NDJSON.')
+@with_appcontext
+def import_command(kind, path, format, chunk_size, resume, errors_file):
+    """Validate and upsert venues, artists or shows from CSV or NDJSON."""
+    format = format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    state = run_import(kind, path, format, chunk_size, resume, errors_file)
+    refresh_after_import(kind)
+    click.echo('Done: {loaded} loaded, {rejected} rejected.'.format(**state))
@@ -0,0 +1,133 @@
+import hashlib
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#----------------------------------------------------------------------------#
+# Statement fingerprints.
+#----------------------------------------------------------------------------#
+
+_parameters = re.compile(r"%\([^)]*\)s|%s|\?|:\w+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_lists = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_whitespace = re.compile(r'\s+')
+
+def normalize(statement):
+    # Literals and bound parameters become ?, expanded IN lists collapse to
+    # one entry, so every iteration of an N+1 loop shares a fingerprint.
+    statement = _parameters.sub('?', statement)
+    statement = _lists.sub('(?)', statement)
+    return _whitespace.sub(' ', statement).strip()
+
+def fingerprint(statement):
+    return hashlib.sha1(normalize(statement).encode()).hexdigest()[:12]
+
+
+#----------------------------------------------------------------------------#
+# Per-request instrumentation.
+#----------------------------------------------------------------------------#
+
+class StatementBudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = None
+        self.slowest_duration = 0.0
+        self.fingerprints = Counter()
+        self.statements = {}
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        key = fingerprint(statement)
+        self.fingerprints[key] += 1
+        self.statements.setdefault(key, normalize(statement))
+        if duration >= self.slowest_duration:
+            self.slowest = key
+            self.slowest_duration = duration
+
+    def repeated(self, threshold):
+        return [(key, count) for key, count in self.fingerprints.most_common() if count >= threshold]
+
+
+class SQLInstrumentation:
+    # Counts and times every statement run while handling a request and
+    # reports them as Server-Timing headers and one structured log record.
+    # Listens on the Engine class so replica and primary engines alike are
+    # covered; statements outside a request (CLI, startup) are ignored.
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SQL_INSTRUMENTATION', True)
+        app.config.setdefault('SQL_STATEMENT_BUDGET', None)
+        app.config.setdefault('SQL_REPEAT_THRESHOLD', 5)
+        if not app.config['SQL_INSTRUMENTATION']:
+            return
+
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+    def start(self):
+        g.sql_stats = RequestStats()
+
+    def finish(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} statements"'.format(
+            stats.duration * 1000, stats.count))
+        if stats.slowest:
+            response.headers.add('Server-Timing', 'db-slowest;dur={:.2f};desc="{}"'.format(
+                stats.slowest_duration * 1000, stats.slowest))
+
+        repeated = stats.repeated(self.app.config['SQL_REPEAT_THRESHOLD'])
+        self.app.logger.info('sql', extra={'fields': {
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'statements': stats.count,
+            'db_ms': round(stats.duration * 1000, 2),
+            'slowest_ms': round(stats.slowest_duration * 1000, 2),
+            'slowest': stats.statements.get(stats.slowest),
+            'repeated': [{'fingerprint': key, 'count': count, 'statement': stats.statements[key]}
+                for key, count in repeated],
+        }})
+
+        budget = self.app.config['SQL_STATEMENT_BUDGET']
+        if budget is not None and stats.count > budget:
+            message = '{} ran {} statements (budget {}); repeated: {}'.format(
+                request.endpoint, stats.count, budget,
+                ', '.join('{} x{}'.format(stats.statements[key], count) for key, count in repeated) or 'none')
+            if self.app.testing:
+                raise StatementBudgetExceeded(message)
+            self.app.logger.warning(message)
+
+        return response
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_stats' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_stats' in g and conn.info.get('query_started'):
+        g.sql_stats.record(statement, time.perf_counter() - conn.info['query_started'].pop())
+
+
+sql_instrumentation = SQLInstrumentation()
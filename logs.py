@@ -0,0 +1,191 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+
+#----------------------------------------------------------------------------#
+# Records.
+#----------------------------------------------------------------------------#
+
+class RequestContextFilter(logging.Filter):
+    # Stamps records with the request they were logged from. Runs on the
+    # request thread, before the record is queued.
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    # One JSON object per line. Structured data passed as
+    # logger.info(message, extra={'fields': {...}}) is merged in.
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name in ('request_id', 'method', 'path'):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+#----------------------------------------------------------------------------#
+# Pipeline.
+#----------------------------------------------------------------------------#
+
+class DroppingQueueHandler(QueueHandler):
+    # Never blocks the caller: when the queue is full the record is dropped
+    # and counted instead.
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingListener(QueueListener):
+    # Writes records on its own thread. Handlers may buffer; they are
+    # flushed whenever the queue has been idle for flush_interval seconds.
+
+    def __init__(self, queue, *handlers, flush_interval=1.0):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, self.flush_interval if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+                self.flush()
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        super().stop()
+        self.flush()
+
+
+class StructuredLogging:
+    # Routes app.logger through a bounded queue to a background thread that
+    # formats nothing and only writes: JSON lines to a size-rotated file, in
+    # batches of LOG_BATCH_SIZE (errors are written at once), and to stderr
+    # in debug mode.
+
+    def __init__(self):
+        self.app = None
+        self.handler = None
+        self.listener = None
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('LOG_LEVEL', 'INFO')
+        app.config.setdefault('LOG_FILE', None)
+        app.config.setdefault('LOG_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('LOG_BACKUP_COUNT', 5)
+        app.config.setdefault('LOG_BATCH_SIZE', 100)
+        app.config.setdefault('LOG_FLUSH_INTERVAL', 1.0)
+        app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+
+        first = self.handler is None
+        if not first:
+            # Another app from the same factory: replace the previous pipeline.
+            self.stop()
+            app.logger.removeHandler(self.handler)
+
+        self.handler = DroppingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+        self.handler.addFilter(RequestContextFilter())
+        self.handler.setFormatter(JSONFormatter())
+
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(self.handler)
+        app.logger.setLevel(app.config['LOG_LEVEL'])
+        app.logger.propagate = False
+
+        self.start()
+        if first:
+            atexit.register(self.stop)
+            if hasattr(os, 'register_at_fork'):
+                # The listener thread does not survive a fork; each worker
+                # gets a fresh queue and thread of its own.
+                os.register_at_fork(after_in_child=self.restart)
+
+        app.before_request(self.assign_request_id)
+        app.after_request(self.echo_request_id)
+
+    def handlers(self):
+        config = self.app.config
+        # Records arrive already formatted as JSON by the queue handler.
+        formatter = logging.Formatter('%(message)s')
+        handlers = []
+        if config['LOG_FILE']:
+            # Rotation is not safe across processes; with several workers
+            # give each its own file, e.g. LOG_FILE = 'logs/fyyur.{pid}.log'.
+            path = config['LOG_FILE'].format(pid=os.getpid())
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            target = RotatingFileHandler(path,
+                maxBytes=config['LOG_MAX_BYTES'], backupCount=config['LOG_BACKUP_COUNT'])
+            target.setFormatter(formatter)
+            handlers.append(MemoryHandler(config['LOG_BATCH_SIZE'],
+                flushLevel=logging.ERROR, target=target))
+        if self.app.debug or not handlers:
+            stream = logging.StreamHandler(sys.stderr)
+            stream.setFormatter(formatter)
+            handlers.append(stream)
+        return handlers
+
+    def start(self):
+        self.listener = BatchingListener(self.handler.queue, *self.handlers(),
+            flush_interval=self.app.config['LOG_FLUSH_INTERVAL'])
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart(self):
+        self.listener = None
+        self.handler.queue = queue.Queue(self.app.config['LOG_QUEUE_SIZE'])
+        self.handler.dropped = 0
+        self.start()
+
+    def assign_request_id(self):
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    def echo_request_id(self, response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+
+structured_logging = StructuredLogging()
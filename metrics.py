@@ -0,0 +1,378 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from flask import current_app, g, request
+from flask.signals import signals_available, before_render_template, template_rendered
+from sqlalchemy.pool import QueuePool
+
+
+#----------------------------------------------------------------------------#
+# Registry.
+#----------------------------------------------------------------------------#
+
+# Every thread writes to its own shard, so recording a sample never takes a
+# lock; shards are summed when the metrics are collected. Shards of threads
+# that have exited are folded into a retired total on the next collection.
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+POOL_BUCKETS = (.001, .005, .01, .05, .1, .5, 1, 5, 30)
+
+def merge(into, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            previous = into.get(key) or [0] * len(value)
+            into[key] = [a + b for a, b in zip(previous, value)]
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+        self.reset()
+        if hasattr(os, 'register_at_fork'):
+            # Workers forked from a preloaded master start from zero.
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []
+        self.retired = {}
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(self, name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(self, name, help, labels, buckets))
+
+    def gauge(self, name, help, labels=(), collect=None):
+        return self.register(Gauge(self, name, help, labels, collect))
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append((threading.current_thread(), shard))
+            return shard
+
+    def collect(self):
+        # Counter and histogram totals for this process.
+        with self.lock:
+            live = []
+            for thread, shard in self.shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    merge(self.retired, shard)
+            self.shards = live
+
+            totals = {}
+            merge(totals, self.retired)
+            for thread, shard in live:
+                merge(totals, dict(shard))
+        return totals
+
+    def collect_gauges(self):
+        values = {}
+        for metric in self.metrics:
+            if isinstance(metric, Gauge):
+                for labels, value in metric.collect():
+                    values[(metric.name, tuple(labels))] = value
+        return values
+
+
+class Metric:
+
+    def __init__(self, registry, name, help, labels):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, help, labels, buckets):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # One slot per bucket, one for +Inf, then the running sum.
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        slots = shard.get(key)
+        if slots is None:
+            slots = shard[key] = [0] * (len(self.buckets) + 2)
+        slots[bisect_left(self.buckets, value)] += 1
+        slots[-1] += value
+
+
+class Gauge(Metric):
+    # Sampled when metrics are collected rather than recorded as they change.
+    type = 'gauge'
+
+    def __init__(self, registry, name, help, labels, collect):
+        super().__init__(registry, name, help, labels)
+        self.collect = collect or (lambda: ())
+
+
+#----------------------------------------------------------------------------#
+# Exposition.
+#----------------------------------------------------------------------------#
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, escape(value)) for name, value in pairs) + '}'
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def exposition(registry, values):
+    lines = []
+    for metric in registry.metrics:
+        samples = sorted((labels, value) for (name, labels), value in values.items()
+            if name == metric.name)
+        lines.append('# HELP {} {}'.format(metric.name, metric.help))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+        for labels, value in samples:
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), value):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(metric.name,
+                        format_labels(metric.labels, labels, [('le', bound)]), cumulative))
+                lines.append('{}_sum{} {}'.format(metric.name,
+                    format_labels(metric.labels, labels), format_number(value[-1])))
+                lines.append('{}_count{} {}'.format(metric.name,
+                    format_labels(metric.labels, labels), cumulative))
+            else:
+                lines.append('{}{} {}'.format(metric.name,
+                    format_labels(metric.labels, labels), format_number(value)))
+    return '\n'.join(lines) + '\n'
+
+
+#----------------------------------------------------------------------------#
+# Multi-process collection.
+#----------------------------------------------------------------------------#
+
+# With METRICS_DIR set, each worker periodically replaces its own snapshot
+# file there and a scrape, whichever worker answers it, sums every snapshot.
+# Files of exited workers are kept so counters never go backwards, but their
+# gauges are dropped; clear the directory when the server is restarted.
+
+def encode(values):
+    return [[name, list(labels), value] for (name, labels), value in values.items()]
+
+def decode(entries):
+    return {(name, tuple(labels)): value for name, labels, value in entries}
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SnapshotStore:
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.path = os.path.join(self.directory, '{}.{}.json'.format(os.getpid(), uuid.uuid4().hex[:8]))
+
+    def write(self, values, gauges):
+        temporary = '{}.{}'.format(self.path, uuid.uuid4().hex)
+        with open(temporary, 'w') as f:
+            json.dump({'pid': os.getpid(), 'values': encode(values), 'gauges': encode(gauges)}, f)
+        os.replace(temporary, self.path)
+
+    def read(self):
+        # Every other worker's snapshot, as (values, gauges of live workers).
+        values, gauges = {}, {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            if path == self.path:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            merge(values, decode(snapshot['values']))
+            if alive(snapshot['pid']):
+                merge(gauges, decode(snapshot['gauges']))
+        return values, gauges
+
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+registry = Registry()
+
+http_requests = registry.counter('fyyur_http_requests_total',
+    'Requests handled, by endpoint, method and status.', ('endpoint', 'method', 'status'))
+http_request_duration = registry.histogram('fyyur_http_request_duration_seconds',
+    'Time spent handling a request, by endpoint.', ('endpoint',))
+template_render_duration = registry.histogram('fyyur_template_render_seconds',
+    'Time spent rendering a template, by template.', ('template',))
+cache_lookups = registry.counter('fyyur_cache_lookups_total',
+    'Listing fragment cache lookups, by result.', ('result',))
+pool_checkout_wait = registry.histogram('fyyur_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled database connection.', buckets=POOL_BUCKETS)
+pool_connections = registry.gauge('fyyur_db_pool_connections',
+    'Pooled database connections, by state.', ('state',))
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that records how long each checkout waited for a connection,
+    # including the time to open a new one.
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+class Metrics:
+    # Request, template, cache and connection pool metrics served at
+    # /metrics in the Prometheus text format.
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.app = None
+        self.store = None
+        self.flusher_pid = None
+        self.flusher_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 5)
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('poolclass', TimedQueuePool)
+
+        pool_connections.collect = self.pool_state
+
+        if app.config['METRICS_DIR']:
+            self.store = SnapshotStore(app.config['METRICS_DIR'])
+            atexit.register(self.flush)
+
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        if signals_available:
+            before_render_template.connect(self.template_started, app)
+            template_rendered.connect(self.template_finished, app)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def pool_state(self):
+        from models import db
+        with self.app.app_context():
+            pool = db.engine.pool
+        if not isinstance(pool, QueuePool):
+            return ()
+        return [
+            (('size',), pool.size()),
+            (('checked_out',), pool.checkedout()),
+            (('overflow',), max(pool.overflow(), 0)),
+        ]
+
+    def start(self):
+        g.metrics_started = time.perf_counter()
+
+    def finish(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        http_requests.inc(endpoint, request.method, str(response.status_code))
+        http_request_duration.observe(time.perf_counter() - started, endpoint)
+
+        if self.store and self.flusher_pid != os.getpid():
+            self.start_flusher()
+        return response
+
+    def template_started(self, sender, template, context, **extra):
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+    def template_finished(self, sender, template, context, **extra):
+        started = g.get('template_started')
+        if started:
+            template_render_duration.observe(time.perf_counter() - started.pop(), template.name or 'string')
+
+    def start_flusher(self):
+        # One thread per worker process, started on its first request (a
+        # preloaded master's threads do not survive the fork), so an idle
+        # worker's snapshot still catches up with its last requests.
+        with self.flusher_lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+            threading.Thread(target=self.flush_periodically, daemon=True).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.app.config['METRICS_FLUSH_INTERVAL'])
+            self.flush()
+
+    def flush(self):
+        values = self.registry.collect()
+        gauges = self.registry.collect_gauges()
+        if self.store:
+            self.store.write(values, gauges)
+        return values, gauges
+
+    def view(self):
+        values, gauges = self.flush()
+        if self.store:
+            other_values, other_gauges = self.store.read()
+            merge(values, other_values)
+            merge(gauges, other_gauges)
+        values.update(gauges)
+        return current_app.response_class(exposition(self.registry, values),
+            content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = Metrics(registry)
@@ -3,6 +3,7 @@ from __future__ import with_statement
 import logging
 from logging.config import fileConfig
 
+import re
 from flask import current_app
 
 from alembic import context
@@ -26,6 +27,15 @@ config.set_main_option(
         '%', '%%'))
 target_metadata = current_app.extensions['migrate'].db.metadata
 
+# The monthly partitions of "Show" (and their indexes) are created at
+# runtime by partitions.py, not declared as models; autogenerate would
+# otherwise try to drop them.
+PARTITION = re.compile(r'^Show_(p\d{4}_\d{2}|default)$')
+
+def include_object(object, name, type_, reflected, compare_to):
+    table = object if type_ == 'table' else getattr(object, 'table', None)
+    return not (reflected and table is not None and PARTITION.match(table.name))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -78,6 +88,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
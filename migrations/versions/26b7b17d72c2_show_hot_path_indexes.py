@@ -0,0 +1,39 @@
+"""show hot path indexes
+
+Revision ID: 26b7b17d72c2
+Revises: e5ad57b0107e
+Create Date: 2026-10-18 09:12:40.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '26b7b17d72c2'
+down_revision = 'e5ad57b0107e'
+branch_labels = None
+depends_on = None
+
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction, so every
+# statement runs in an autocommit block and the migration can be applied
+# while the app keeps serving traffic.
+INDEXES = [
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time']),
+    ('ix_Show_start_time', 'Show', ['start_time']),
+    ('ix_Venue_city_state', 'Venue', ['city', 'state']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
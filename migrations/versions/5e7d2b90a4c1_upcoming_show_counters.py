@@ -0,0 +1,37 @@
+"""upcoming show counters
+
+Revision ID: 5e7d2b90a4c1
+Revises: d8a3c61f5e02
+Create Date: 2026-10-18 13:48:51.220734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7d2b90a4c1'
+down_revision = 'd8a3c61f5e02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute('''
+        UPDATE "Venue" SET upcoming_shows_count = (
+            SELECT count(*) FROM "Show"
+            WHERE "Show".venue_id = "Venue".id AND "Show".start_time > now())
+    ''')
+    op.execute('''
+        UPDATE "Artist" SET upcoming_shows_count = (
+            SELECT count(*) FROM "Show"
+            WHERE "Show".artist_id = "Artist".id AND "Show".start_time > now())
+    ''')
+
+
+def downgrade():
+    op.drop_column('Artist', 'upcoming_shows_count')
+    op.drop_column('Venue', 'upcoming_shows_count')
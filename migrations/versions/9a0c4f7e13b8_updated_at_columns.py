@@ -0,0 +1,38 @@
+"""updated_at columns
+
+Revision ID: 9a0c4f7e13b8
+Revises: 5e7d2b90a4c1
+Create Date: 2026-10-18 15:07:33.480129
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a0c4f7e13b8'
+down_revision = '5e7d2b90a4c1'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['Venue', 'Artist', 'Show']
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+
+    # MAX(updated_at) for the conditional GET fingerprints is an index lookup.
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index('ix_{}_updated_at'.format(table), table, ['updated_at'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in reversed(TABLES):
+            op.drop_index('ix_{}_updated_at'.format(table), table_name=table, postgresql_concurrently=True)
+
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,30 @@
+"""updated_at from clock_timestamp()
+
+Revision ID: a7d4c2e9b150
+Revises: f2b8e4a61d3c
+Create Date: 2026-10-18 22:04:17.561203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4c2e9b150'
+down_revision = 'f2b8e4a61d3c'
+branch_labels = None
+depends_on = None
+
+
+# Show's default reaches its partitions, present and future.
+TABLES = ['Venue', 'Artist', 'Show']
+
+
+def upgrade():
+    for table in TABLES:
+        op.alter_column(table, 'updated_at', server_default=sa.text('clock_timestamp()'))
+
+
+def downgrade():
+    for table in TABLES:
+        op.alter_column(table, 'updated_at', server_default=sa.text('now()'))
@@ -0,0 +1,35 @@
+"""listing name indexes
+
+Revision ID: b41f0e9c2d7a
+Revises: 26b7b17d72c2
+Create Date: 2026-10-18 10:02:15.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41f0e9c2d7a'
+down_revision = '26b7b17d72c2'
+branch_labels = None
+depends_on = None
+
+
+# Keyset pagination of /artists and /venues walks (name, id) in order.
+INDEXES = [
+    ('ix_Artist_name_id', 'Artist', ['name', 'id']),
+    ('ix_Venue_name_id', 'Venue', ['name', 'id']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,31 @@
+"""Venue and Artist name NOT NULL
+
+Revision ID: b9e1f3c5d702
+Revises: a7d4c2e9b150
+Create Date: 2026-10-18 22:31:40.118275
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e1f3c5d702'
+down_revision = 'a7d4c2e9b150'
+branch_labels = None
+depends_on = None
+
+
+# The listings page on (name, id); a NULL name has no place in that order.
+TABLES = ['Venue', 'Artist']
+
+
+def upgrade():
+    for table in TABLES:
+        op.execute('UPDATE "{}" SET name = \'\' WHERE name IS NULL'.format(table))
+        op.alter_column(table, 'name', existing_type=sa.String(), nullable=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.alter_column(table, 'name', existing_type=sa.String(), nullable=True)
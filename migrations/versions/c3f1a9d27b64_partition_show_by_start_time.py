@@ -0,0 +1,87 @@
+"""partition Show by start_time
+
+Revision ID: c3f1a9d27b64
+Revises: 9a0c4f7e13b8
+Create Date: 2026-10-18 18:22:10.914306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a9d27b64'
+down_revision = '9a0c4f7e13b8'
+branch_labels = None
+depends_on = None
+
+
+# Months ahead of the current one to create; later ones are added by
+# `flask ensure-partitions` (partitions.py).
+MONTHS_AHEAD = 12
+
+INDEXES = [
+    ('ix_Show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_Show_start_time', ['start_time']),
+    ('ix_Show_updated_at', ['updated_at']),
+]
+
+# PRIMARY KEY is filled in: a partitioned table's keys must include the
+# partition column.
+COLUMNS = '''
+    id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+    venue_id integer NOT NULL,
+    artist_id integer NOT NULL,
+    start_time timestamp without time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT "Show_pkey" PRIMARY KEY ({}),
+    CONSTRAINT "Show_venue_id_fkey" FOREIGN KEY (venue_id) REFERENCES "Venue"(id) ON DELETE CASCADE,
+    CONSTRAINT "Show_artist_id_fkey" FOREIGN KEY (artist_id) REFERENCES "Artist"(id) ON DELETE CASCADE
+'''
+COPY = 'INSERT INTO "Show" (id, venue_id, artist_id, start_time, updated_at) ' \
+    'SELECT id, venue_id, artist_id, start_time, updated_at FROM "{}"'
+
+
+def set_aside(name):
+    # Renames "Show" and frees its index names for the new table; the
+    # sequence is detached so dropping the old table keeps it.
+    op.execute('ALTER TABLE "Show" RENAME TO "{}"'.format(name))
+    for index, columns in INDEXES:
+        op.drop_index(index, table_name=name)
+    op.execute('ALTER TABLE "{}" DROP CONSTRAINT "Show_pkey"'.format(name))
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+
+def finish(name):
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('DROP TABLE "{}" CASCADE'.format(name))
+    for index, columns in INDEXES:
+        op.create_index(index, 'Show', columns, unique=False)
+
+
+def upgrade():
+    set_aside('Show_unpartitioned')
+    op.execute('CREATE TABLE "Show" ({}) PARTITION BY RANGE (start_time)'.format(COLUMNS.format('id, start_time')))
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    # One partition per month that has shows, and for the months ahead.
+    months = op.get_bind().execute(sa.text('''
+        SELECT date_trunc('month', start_time) FROM "Show_unpartitioned"
+        UNION
+        SELECT generate_series(date_trunc('month', now()), date_trunc('month', now()) + :ahead * interval '1 month', interval '1 month')::timestamp
+        ORDER BY 1
+    '''), {'ahead': MONTHS_AHEAD}).scalars().all()
+    for month in months:
+        until = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+        op.execute('''CREATE TABLE "Show_p{:%Y_%m}" PARTITION OF "Show" FOR VALUES FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')'''.format(month, month, until))
+
+    op.execute(COPY.format('Show_unpartitioned'))
+    finish('Show_unpartitioned')
+
+
+def downgrade():
+    # Partitions already archived to the show_archive schema are left there.
+    set_aside('Show_partitioned')
+    op.execute('CREATE TABLE "Show" ({})'.format(COLUMNS.format('id')))
+    op.execute(COPY.format('Show_partitioned'))
+    finish('Show_partitioned')
@@ -0,0 +1,52 @@
+"""Venue area index
+
+Revision ID: d5c8e1a4f7b3
+Revises: b9e1f3c5d702
+Create Date: 2026-10-18 23:52:07.441920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5c8e1a4f7b3'
+down_revision = 'b9e1f3c5d702'
+branch_labels = None
+depends_on = None
+
+
+# /venues pages on (state, city, name, id) so an area's venues are never
+# split between pages by other areas; NULLs have no place in that order.
+# The (city, state) and (name, id) indexes have no other query left.
+COLUMNS = ['city', 'state']
+DROPPED = [
+    ('ix_Venue_city_state', 'Venue', ['city', 'state']),
+    ('ix_Venue_name_id', 'Venue', ['name', 'id']),
+]
+CREATED = [
+    ('ix_Venue_area', 'Venue', ['state', 'city', 'name', 'id']),
+]
+
+
+def upgrade():
+    for column in COLUMNS:
+        op.execute('UPDATE "Venue" SET {0} = \'\' WHERE {0} IS NULL'.format(column))
+        op.alter_column('Venue', column, existing_type=sa.String(length=120), nullable=False)
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in CREATED:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        for name, table, columns in DROPPED:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(DROPPED):
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        for name, table, columns in reversed(CREATED):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    for column in COLUMNS:
+        op.alter_column('Venue', column, existing_type=sa.String(length=120), nullable=True)
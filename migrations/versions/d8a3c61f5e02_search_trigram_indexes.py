@@ -0,0 +1,42 @@
+"""search trigram indexes
+
+Revision ID: d8a3c61f5e02
+Revises: b41f0e9c2d7a
+Create Date: 2026-10-18 11:26:03.942871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a3c61f5e02'
+down_revision = 'b41f0e9c2d7a'
+branch_labels = None
+depends_on = None
+
+
+# pg_trgm GIN indexes serve both ILIKE '%term%' and the % similarity
+# operator used by search.py; the plain GIN index on genres serves &&.
+INDEXES = [
+    ('ix_Venue_name_trgm', 'Venue', ['name'], {'name': 'gin_trgm_ops'}),
+    ('ix_Venue_city_trgm', 'Venue', ['city'], {'city': 'gin_trgm_ops'}),
+    ('ix_Venue_genres', 'Venue', ['genres'], {}),
+    ('ix_Artist_name_trgm', 'Artist', ['name'], {'name': 'gin_trgm_ops'}),
+    ('ix_Artist_city_trgm', 'Artist', ['city'], {'city': 'gin_trgm_ops'}),
+    ('ix_Artist_genres', 'Artist', ['genres'], {}),
+]
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, table, columns, ops in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                postgresql_using='gin', postgresql_ops=ops, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, ops in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,80 @@
+"""Show end_time and overlap exclusion
+
+Revision ID: f2b8e4a61d3c
+Revises: c3f1a9d27b64
+Create Date: 2026-10-18 20:41:52.308417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8e4a61d3c'
+down_revision = 'c3f1a9d27b64'
+branch_labels = None
+depends_on = None
+
+
+# Existing shows are given the default length (models.SHOW_DURATION).
+DURATION = "interval '2 hours'"
+
+# A partitioned table cannot carry an exclusion constraint that leaves out
+# the partition key, so each partition carries its own; past months are
+# left alone, as they may already hold overlapping shows. Partitions made
+# later get them from partitions.create_partition().
+EXCLUSIONS = {
+    'venue_excl': 'venue_id WITH =, tsrange(start_time, end_time) WITH &&',
+    'artist_excl': 'artist_id WITH =, tsrange(start_time, end_time) WITH &&',
+}
+
+
+# Shows booked before the constraints existed may already clash; they are
+# listed so they can be rescheduled, rather than surfacing as an
+# ExclusionViolation halfway through the upgrade.
+def check_overlaps(partitions):
+    clashes = []
+    for partition in partitions:
+        clashes += op.get_bind().execute(sa.text('''
+            SELECT a.id, b.id, CASE WHEN a.venue_id = b.venue_id THEN 'venue' ELSE 'artist' END
+            FROM "{0}" a JOIN "{0}" b
+              ON (a.venue_id = b.venue_id OR a.artist_id = b.artist_id) AND a.id < b.id
+             AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time)
+            ORDER BY a.id, b.id
+        '''.format(partition))).all()
+    if clashes:
+        raise RuntimeError('Overlapping upcoming shows, reschedule them before upgrading:\n' + '\n'.join(
+            '  show {} and show {} share a {}'.format(*clash) for clash in clashes))
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute('UPDATE "Show" SET end_time = start_time + {}'.format(DURATION))
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_Show_duration', 'Show', "end_time > start_time AND end_time <= start_time + interval '1 day'")
+
+    # Integer equality in a GiST index.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    partitions = op.get_bind().execute(sa.text('''
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = '"Show"'::regclass
+          AND (c.relname = 'Show_default' OR c.relname >= 'Show_p' || to_char(now(), 'YYYY_MM'))
+        ORDER BY c.relname
+    ''')).scalars().all()
+    check_overlaps(partitions)
+    for partition in partitions:
+        for suffix, definition in EXCLUSIONS.items():
+            op.execute('ALTER TABLE "{0}" ADD CONSTRAINT "{0}_{1}" EXCLUDE USING gist ({2})'.format(partition, suffix, definition))
+
+
+def downgrade():
+    # Including those on partitions created since the upgrade.
+    constraints = op.get_bind().execute(sa.text('''
+        SELECT c.relname, x.conname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_constraint x ON x.conrelid = c.oid AND x.contype = 'x'
+        WHERE i.inhparent = '"Show"'::regclass
+    ''')).all()
+    for partition, constraint in constraints:
+        op.drop_constraint(constraint, partition)
+    op.drop_constraint('ck_Show_duration', 'Show', type_='check')
+    op.drop_column('Show', 'end_time')
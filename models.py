@@ -1,6 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import timedelta
+from sqlalchemy.orm import noload
+from replicas import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -8,11 +10,17 @@ db = SQLAlchemy()
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_area', 'state', 'city', 'name', 'id'),
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
@@ -21,15 +29,23 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(250))
     genres = db.Column(db.ARRAY(db.String))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True, server_default=db.func.clock_timestamp(), onupdate=db.func.clock_timestamp())
 
-    shows = db.relationship('Show', cascade="all, delete", backref='venue', lazy='joined')
+    shows = db.relationship('Show', cascade="all, delete", backref='venue', lazy='select')
 
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -39,14 +55,62 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(250))
     genres = db.Column(db.ARRAY(db.String))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True, server_default=db.func.clock_timestamp(), onupdate=db.func.clock_timestamp())
+
+    shows = db.relationship('Show', cascade='all, delete', backref='artist', lazy='select')
 
-    shows = db.relationship('Show', cascade='all, delete', backref='artist', lazy='joined')
 
+# Shows listed without an end run this long; none may run longer than
+# MAX_SHOW_DURATION, which bounds how far back an overlapping show can start.
+SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(days=1)
+
+def show_end(start_time, duration=SHOW_DURATION):
+    # None when the duration is out of range, or the end is past datetime.max.
+    if not timedelta(0) < duration <= MAX_SHOW_DURATION:
+        return None
+    try:
+        return start_time + duration
+    except OverflowError:
+        return None
+
+def default_end_time(context):
+    return show_end(context.get_current_parameters()['start_time'])
 
 class Show(db.Model):
+    # Partitioned by month of start_time (see partitions.py), so the primary
+    # key includes it; ids still come from one sequence. Each current and
+    # future partition also excludes overlapping shows per venue and per
+    # artist (see scheduling.py).
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time', 'start_time'),
+        db.CheckConstraint("end_time > start_time AND end_time <= start_time + interval '1 day'", name='ck_Show_duration'),
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
\ No newline at end of file
+    start_time = db.Column(db.DateTime, primary_key=True)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True, server_default=db.func.clock_timestamp(), onupdate=db.func.clock_timestamp())
+
+
+#----------------------------------------------------------------------------#
+# Loading profiles.
+#----------------------------------------------------------------------------#
+
+# Relationships load lazily by default; views that load mapped instances
+# opt into the profile matching what they use. Listings and detail pages
+# query plain rows (queries.py, viewmodels.py) and need none.
+LOAD_PROFILES = {
+    # All columns for populating a form, no shows.
+    'edit': lambda model: [noload('*')],
+}
+
+def load_options(model, profile):
+    return LOAD_PROFILES[profile](model)
@@ -0,0 +1,167 @@
+import re
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import column, func, select, table, text
+from models import db
+from cache import page_cache
+
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# "Show" is range-partitioned on start_time, one partition per calendar month
+# ("Show_p2021_11"), plus "Show_default" for rows no partition covers yet.
+# Queries on upcoming shows only scan the current and future months, and
+# old months can be detached whole instead of deleted row by row.
+#
+# ensure_partitions() creates the months ahead and splits any month that has
+# rows in the default partition out into its own; it runs when gunicorn
+# starts and should also run from cron (`flask ensure-partitions`), at least
+# monthly. archive_partitions() detaches months that ended before a cutoff
+# into the show_archive schema, or drops them.
+
+PARENT = 'Show'
+DEFAULT = 'Show_default'
+ARCHIVE_SCHEMA = 'show_archive'
+BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# Kept on each partition rather than the parent, which cannot carry them
+# (see scheduling.py): no venue or artist has two shows at once.
+EXCLUSIONS = {
+    'venue_excl': 'venue_id WITH =, tsrange(start_time, end_time) WITH &&',
+    'artist_excl': 'artist_id WITH =, tsrange(start_time, end_time) WITH &&',
+}
+
+# Taken for the duration of a transaction that adds or removes partitions.
+LOCK_ID = 0x5a0f
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return 'Show_p{:%Y_%m}'.format(month)
+
+def is_partitioned(connection):
+    return connection.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:name)"),
+        {'name': '"{}"'.format(PARENT)}).scalar() or False
+
+def attached_partitions(connection):
+    # {name: (from, to)} for the monthly partitions, oldest first.
+    rows = connection.execute(text(
+        'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+        'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:name) '
+        'ORDER BY c.relname'),
+        {'name': '"{}"'.format(PARENT)})
+    partitions = {}
+    for name, bound in rows:
+        match = BOUNDS.search(bound)
+        if match:
+            partitions[name] = tuple(datetime.fromisoformat(value) for value in match.groups())
+    return partitions
+
+def partition_count():
+    # Scalar subquery for fingerprints: changes when a month is archived.
+    inherits = table('pg_inherits', column('inhparent'))
+    return select(func.count()).select_from(inherits) \
+        .where(inherits.c.inhparent == text("'\"{}\"'::regclass".format(PARENT))) \
+        .scalar_subquery()
+
+
+def create_partition(connection, month):
+    # Rows for the month may already sit in the default partition, and a
+    # partition cannot be added while they do: the new table is filled from
+    # the default partition first, then attached.
+    name, until = partition_name(month), add_months(month, 1)
+    connection.execute(text('CREATE TABLE "{}" (LIKE "{}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(name, PARENT)))
+    for suffix, definition in EXCLUSIONS.items():
+        connection.execute(text('ALTER TABLE "{0}" ADD CONSTRAINT "{0}_{1}" EXCLUDE USING gist ({2})'.format(name, suffix, definition)))
+    connection.execute(text(
+        'WITH moved AS (DELETE FROM "{default}" WHERE start_time >= :month AND start_time < :until RETURNING *) '
+        'INSERT INTO "{name}" SELECT * FROM moved'.format(default=DEFAULT, name=name)),
+        {'month': month, 'until': until})
+    connection.execute(text(
+        "ALTER TABLE \"{}\" ATTACH PARTITION \"{}\" FOR VALUES FROM ('{}') TO ('{}')"
+        .format(PARENT, name, month.isoformat(' '), until.isoformat(' '))))
+    return name
+
+def ensure_partitions(connection, ahead=12, now=None):
+    # Partitions for this month and the next `ahead`, and for every month
+    # that has rows in the default partition. Returns the names created.
+    connection.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': LOCK_ID})
+    existing = attached_partitions(connection)
+    current = month_start(now or datetime.now())
+    months = {add_months(current, offset) for offset in range(ahead + 1)}
+    months.update(month_start(value) for value, in connection.execute(text(
+        'SELECT DISTINCT date_trunc(\'month\', start_time) FROM "{}"'.format(DEFAULT))))
+    return [create_partition(connection, month) for month in sorted(months)
+        if partition_name(month) not in existing]
+
+def archive_partitions(connection, before, drop=False):
+    # Detaches every monthly partition that ends on or before `before`; the
+    # table moves to the archive schema, or is dropped. Returns the names.
+    connection.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': LOCK_ID})
+    connection.execute(text('CREATE SCHEMA IF NOT EXISTS {}'.format(ARCHIVE_SCHEMA)))
+    archived = []
+    for name, (start, end) in attached_partitions(connection).items():
+        if end > before:
+            continue
+        connection.execute(text('ALTER TABLE "{}" DETACH PARTITION "{}"'.format(PARENT, name)))
+        if drop:
+            connection.execute(text('DROP TABLE "{}"'.format(name)))
+        else:
+            connection.execute(text('ALTER TABLE "{}" SET SCHEMA {}'.format(name, ARCHIVE_SCHEMA)))
+        archived.append(name)
+    return archived
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+def require_partitioned(connection):
+    if not is_partitioned(connection):
+        raise click.ClickException('"Show" is not partitioned; run flask db upgrade first')
+
+@click.command('ensure-partitions')
+@click.option('--ahead', type=int, help='Months ahead to create (default: SHOW_PARTITIONS_AHEAD).')
+@with_appcontext
+def ensure_partitions_command(ahead):
+    """Create the monthly Show partitions ahead of time."""
+    connection = db.session.connection()
+    require_partitioned(connection)
+    created = ensure_partitions(connection, ahead if ahead is not None else current_app.config['SHOW_PARTITIONS_AHEAD'])
+    db.session.commit()
+    click.echo('Created {}.'.format(', '.join(created)) if created else 'Partitions are up to date.')
+
+@click.command('archive-shows')
+@click.option('--before', type=click.DateTime(['%Y-%m']),
+    help='Archive months ending on or before this one starts (default: SHOW_ARCHIVE_AFTER_MONTHS ago).')
+@click.option('--drop', is_flag=True, help='Drop the old partitions instead of keeping them in the show_archive schema.')
+@with_appcontext
+def archive_shows_command(before, drop):
+    """Detach the monthly Show partitions of past shows."""
+    connection = db.session.connection()
+    require_partitioned(connection)
+    current = month_start(datetime.now())
+    before = before or add_months(current, -current_app.config['SHOW_ARCHIVE_AFTER_MONTHS'])
+    if before > current:
+        # Later months hold upcoming shows, which the Venue and Artist
+        # counters include.
+        raise click.ClickException('Only months that have ended can be archived; --before may be {:%Y-%m} at the latest'.format(current))
+    archived = archive_partitions(connection, before, drop)
+    db.session.commit()
+
+    # Archived shows leave the listing and detail pages, which no updated_at
+    # reflects: drop the cached listings. Conditional GETs notice through
+    # the show counts and the number of attached partitions.
+    page_cache.invalidate()
+    click.echo('{} {}.'.format('Dropped' if drop else 'Archived', ', '.join(archived)) if archived
+        else 'Nothing to archive before {:%Y-%m}.'.format(before))
@@ -0,0 +1,150 @@
+import base64
+import json
+from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
+from sqlalchemy import tuple_
+from models import db, Venue, Artist, Show
+from counters import upcoming_shows
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(*values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, *types):
+    # Returns None for the first page, otherwise the key values converted
+    # with `types`, e.g. decode_cursor(cursor, datetime.fromisoformat, int).
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        # Key columns are NOT NULL; str(None) would page from 'None'.
+        if len(values) != len(types) or None in values:
+            raise InvalidCursor(cursor)
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (TypeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+def after_key(query, columns, key, descending=False):
+    # Rows strictly after `key` in (columns) order. The leading column is also
+    # bounded on its own so the planner can use it as an index condition.
+    if key is None:
+        return query
+    if descending:
+        return query.filter(columns[0] <= key[0], tuple_(*columns) < key)
+    return query.filter(columns[0] >= key[0], tuple_(*columns) > key)
+
+def split_page(rows, limit, key):
+    # Queries fetch one extra row to learn whether another page follows.
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+def venue_areas_query(after=None, limit=None):
+    # One statement for a page of the listing: every venue in area order,
+    # by name within an area, with its upcoming show counter.
+    query = db.session.query(
+            Venue.city,
+            Venue.state,
+            Venue.id,
+            Venue.name,
+            upcoming_shows(Venue).label('num_upcoming_shows')
+        ) \
+        .order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+    query = after_key(query, (Venue.state, Venue.city, Venue.name, Venue.id), after)
+
+    return query.limit(limit + 1) if limit else query
+
+def venue_areas(after=None, limit=20):
+    after = decode_cursor(after, str, str, str, int)
+    rows, next_cursor = split_page(
+        venue_areas_query(after, limit).all(), limit, attrgetter('state', 'city', 'name', 'id'))
+
+    # Rows come grouped by area; only an area larger than what is left of
+    # the page carries on at the top of the next one.
+    data = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        data.append({
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.num_upcoming_shows
+            } for venue in venues]
+        })
+
+    return data, next_cursor
+
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+def artists_page_query(after=None, limit=20):
+    query = db.session.query(Artist.id, Artist.name).order_by(Artist.name, Artist.id)
+    query = after_key(query, (Artist.name, Artist.id), after)
+
+    return query.limit(limit + 1)
+
+def artists_page(after=None, limit=20):
+    after = decode_cursor(after, str, int)
+    rows, next_cursor = split_page(
+        artists_page_query(after, limit).all(), limit, attrgetter('name', 'id'))
+
+    return [{'id': artist.id, 'name': artist.name} for artist in rows], next_cursor
+
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def shows_page_query(after=None, limit=20):
+    # Venue and artist columns come from the same statement as the shows.
+    query = db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.venue_id,
+            Venue.name.label('venue_name'),
+            Show.artist_id,
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')
+        ) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .order_by(Show.start_time.desc(), Show.id.desc())
+    query = after_key(query, (Show.start_time, Show.id), after, descending=True)
+
+    return query.limit(limit + 1)
+
+def shows_page(after=None, limit=20):
+    after = decode_cursor(after, datetime.fromisoformat, int)
+    rows, next_cursor = split_page(
+        shows_page_query(after, limit).all(), limit, attrgetter('start_time', 'id'))
+
+    data = []
+    for show in rows:
+        data.append({
+            'venue_id': show.venue_id,
+            'venue_name': show.venue_name,
+            'artist_id': show.artist_id,
+            'artist_name': show.artist_name,
+            'artist_image_link': show.artist_image_link,
+            'start_time': show.start_time
+        })
+
+    return data, next_cursor
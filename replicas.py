@@ -0,0 +1,143 @@
+import itertools
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+
+
+#----------------------------------------------------------------------------#
+# Replica selection.
+#----------------------------------------------------------------------------#
+
+# Replicas are registered as SQLALCHEMY_BINDS named replica0, replica1, ...
+# that no model is bound to, so their engines share the primary's options
+# (pool settings, statement timeout) and lifecycle.
+
+def replica_keys(app):
+    return app.extensions.get('replicas', ())
+
+
+class RoundRobin:
+
+    def __init__(self):
+        self.counter = itertools.count()
+
+    def choose(self, engines):
+        return engines[next(self.counter) % len(engines)]
+
+
+class LeastConnections:
+
+    def choose(self, engines):
+        return min(engines, key=lambda engine: engine.pool.checkedout())
+
+
+SELECTION = {
+    'round_robin': RoundRobin,
+    'least_connections': LeastConnections,
+}
+
+
+#----------------------------------------------------------------------------#
+# Routing.
+#----------------------------------------------------------------------------#
+
+PINNED_UNTIL = 'db_primary_until'
+
+def read_only(view):
+    # Marks a view whose queries may be answered by a replica. Everything
+    # else, and every flush or DML statement, goes to the primary.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def primary():
+    # Sends the block's queries to the primary, even inside a read-only view.
+    previous = g.get('db_read_only', False)
+    g.db_read_only = False
+    try:
+        yield
+    finally:
+        g.db_read_only = previous
+
+def pinned():
+    # A client that wrote recently reads from the primary until replication
+    # has had time to catch up, so it sees its own changes.
+    return session.get(PINNED_UNTIL, 0) > time.time()
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        # Keyword arguments newer SQLAlchemy versions pass through
+        # scoped_session are not used by SignallingSession.
+        if self.use_replica(clause):
+            if 'replica' not in self.info:
+                # One replica per session, so a request reads one snapshot.
+                self.info['replica'] = self.choose_replica()
+            if self.info['replica'] is not None:
+                return self.info['replica']
+        return super().get_bind(mapper, clause)
+
+    def use_replica(self, clause):
+        return (has_request_context()
+            and g.get('db_read_only', False)
+            and not self._flushing
+            and not isinstance(clause, UpdateBase)
+            and not self.info.get('wrote')
+            and not pinned())
+
+    def choose_replica(self):
+        keys = replica_keys(self.app)
+        if not keys:
+            return None
+        engines = [self.db.get_engine(self.app, key) for key in keys]
+        return self.app.extensions['replica_selection'].choose(engines)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def flushed(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def executed(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def committed(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context():
+        session[PINNED_UNTIL] = time.time() + current_app.config['REPLICA_PIN_SECONDS']
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def rolled_back(db_session):
+    db_session.info.pop('wrote', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_SELECTION', 'round_robin')
+        app.config.setdefault('REPLICA_PIN_SECONDS', 5)
+
+        uris = app.config['SQLALCHEMY_REPLICA_URIS']
+        keys = ['replica{}'.format(i) for i in range(len(uris))]
+        app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {}, **dict(zip(keys, uris)))
+        app.extensions['replicas'] = keys
+        app.extensions['replica_selection'] = SELECTION[app.config['REPLICA_SELECTION']]()
+
+        super().init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,158 @@
+import random
+from datetime import datetime
+from collections import defaultdict
+from sqlalchemy import func, or_
+from models import db, Show, MAX_SHOW_DURATION
+
+
+#----------------------------------------------------------------------------#
+# Interval tree.
+#----------------------------------------------------------------------------#
+
+# A treap keyed on start, each node also holding the latest end in its
+# subtree, so a search skips every subtree that is over before the interval
+# starts: O(log n + k) expected per search or insertion. Intervals are
+# half-open, [start, end), so back-to-back shows do not overlap.
+
+class Node:
+    __slots__ = ('start', 'end', 'item', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, item):
+        self.start, self.end, self.item = start, end, item
+        self.priority = random.random()
+        self.left = self.right = None
+        self.max_end = end
+
+def update(node):
+    node.max_end = node.end
+    for child in (node.left, node.right):
+        if child is not None and child.max_end > node.max_end:
+            node.max_end = child.max_end
+
+def rotate_right(node):
+    top = node.left
+    node.left, top.right = top.right, node
+    update(node)
+    update(top)
+    return top
+
+def rotate_left(node):
+    top = node.right
+    node.right, top.left = top.left, node
+    update(node)
+    update(top)
+    return top
+
+
+class IntervalTree:
+
+    def __init__(self, intervals=()):
+        self.root = None
+        self.size = 0
+        for start, end, item in intervals:
+            self.add(start, end, item)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, start, end, item):
+        self.root = self._insert(self.root, Node(start, end, item))
+        self.size += 1
+
+    def _insert(self, node, new):
+        if node is None:
+            return new
+        if new.start < node.start:
+            node.left = self._insert(node.left, new)
+            if node.left.priority > node.priority:
+                return rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new)
+            if node.right.priority > node.priority:
+                return rotate_left(node)
+        update(node)
+        return node
+
+    def overlapping(self, start, end):
+        # Items whose interval overlaps [start, end), by start.
+        found = []
+        self._search(self.root, start, end, found)
+        return found
+
+    def _search(self, node, start, end, found):
+        if node is None or node.max_end <= start:
+            return
+        self._search(node.left, start, end, found)
+        if node.start < end:
+            if node.end > start:
+                found.append(node.item)
+            self._search(node.right, start, end, found)
+
+
+#----------------------------------------------------------------------------#
+# Conflicts.
+#----------------------------------------------------------------------------#
+
+# A venue hosts, and an artist plays, one show at a time. Candidates are
+# read in one statement, through the GiST indexes behind each partition's
+# exclusion constraints (tsrange && tsrange); the start_time bound prunes
+# partitions, since no show runs longer than MAX_SHOW_DURATION. The new
+# shows are then checked against them, and against each other, with an
+# interval tree per venue and per artist. This also catches overlaps across
+# a month boundary, which the per-partition constraints cannot see.
+
+VENUE_BOOKED = 'The venue already has a show from {} to {} ({})'
+ARTIST_BOOKED = 'The artist is already playing from {} to {} ({})'
+MESSAGES = {'venue_id': VENUE_BOOKED, 'artist_id': ARTIST_BOOKED}
+
+def overlaps(start, end):
+    # Clamped so a start in the first day of datetime does not overflow.
+    earliest = max(start, datetime.min + MAX_SHOW_DURATION) - MAX_SHOW_DURATION
+    return [
+        Show.start_time < end,
+        Show.start_time > earliest,
+        func.tsrange(Show.start_time, Show.end_time).op('&&')(func.tsrange(start, end)),
+    ]
+
+def booked(shows):
+    # Existing shows sharing a venue or artist with `shows` and overlapping
+    # the span they cover.
+    query = db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time) \
+        .filter(or_(
+            Show.venue_id.in_({show['venue_id'] for show in shows}),
+            Show.artist_id.in_({show['artist_id'] for show in shows})))
+    return query.filter(*overlaps(
+        min(show['start_time'] for show in shows),
+        max(show['end_time'] for show in shows))).all()
+
+def describe(start, end, source):
+    return start.strftime('%Y-%m-%d %H:%M'), end.strftime('%H:%M' if end.date() == start.date() else '%Y-%m-%d %H:%M'), source
+
+def find_conflicts(shows):
+    # Returns {'row': n, 'errors': {field: message}} for every show (rows
+    # numbered from 1) that overlaps an existing show or an earlier row.
+    # Shows carrying an id replace that row, so it is not a conflict.
+    if not shows:
+        return []
+    replaced = {show['id'] for show in shows if 'id' in show}
+    trees = defaultdict(IntervalTree)
+    for show in booked(shows):
+        if show.id not in replaced:
+            for field in MESSAGES:
+                trees[field, getattr(show, field)].add(
+                    show.start_time, show.end_time, describe(show.start_time, show.end_time, 'show {}'.format(show.id)))
+
+    errors = []
+    for number, show in enumerate(shows, 1):
+        start, end = show['start_time'], show['end_time']
+        row_errors = {}
+        for field, message in MESSAGES.items():
+            clashes = trees[field, show[field]].overlapping(start, end)
+            if clashes:
+                row_errors[field] = message.format(*clashes[0])
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+            continue
+        for field in MESSAGES:
+            trees[field, show[field]].add(start, end, describe(start, end, 'row {}'.format(number)))
+    return errors
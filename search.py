@@ -0,0 +1,79 @@
+from sqlalchemy import case, cast, func, literal, or_
+from sqlalchemy.dialects.postgresql import array
+from enums import Genre
+from models import db
+from counters import upcoming_shows
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Name matches outrank city matches, which outrank genre matches.
+NAME_WEIGHT = 1.0
+CITY_WEIGHT = 0.5
+GENRE_WEIGHT = 0.4
+
+def like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%{}%'.format(escaped)
+
+def matching_genres(term):
+    # Genres are stored either by enum name (form submissions) or by label,
+    # so a term matches both spellings of every genre it is part of.
+    term = term.lower()
+    genres = set()
+    for genre in Genre:
+        if term and (term in genre.value.lower() or term in genre.name.lower()):
+            genres.update((genre.name, genre.value))
+    return sorted(genres)
+
+def match_terms(model, term, pattern):
+    # ILIKE and the % similarity operator are both served by the pg_trgm GIN
+    # indexes; genre overlap is served by the GIN index on the genres array.
+    name_match = model.name.ilike(pattern, escape='\\')
+    city_match = model.city.ilike(pattern, escape='\\')
+    conditions = [name_match, model.name.op('%')(term), city_match]
+    ranks = [
+        case((name_match, NAME_WEIGHT), else_=func.similarity(model.name, term) * NAME_WEIGHT),
+        case((city_match, CITY_WEIGHT), else_=0.0),
+    ]
+
+    genres = matching_genres(term)
+    if genres:
+        genre_match = model.genres.op('&&')(cast(array(genres), model.genres.type))
+        conditions.append(genre_match)
+        ranks.append(case((genre_match, GENRE_WEIGHT), else_=0.0))
+
+    return or_(*conditions), func.greatest(*ranks)
+
+def search_query(model, term, limit=None):
+    term = term.strip()
+    pattern = like_pattern(term)
+
+    condition, rank = match_terms(model, term, pattern)
+
+    # The window count reports the total number of matches alongside a
+    # limited page of the best ones, in the same statement.
+    query = db.session.query(
+            model.id,
+            model.name,
+            upcoming_shows(model).label('num_upcoming_shows'),
+            func.count(literal(1)).over().label('total')
+        ) \
+        .filter(condition) \
+        .order_by(rank.desc(), model.name, model.id)
+
+    return query.limit(limit) if limit else query
+
+def search(model, term, limit=None):
+    rows = search_query(model, term, limit).all()
+
+    return {
+        'count': rows[0].total if rows else 0,
+        'data': [{
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.num_upcoming_shows
+        } for row in rows]
+    }
@@ -2,3 +2,30 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// type-ahead for the navbar search forms, answered by /api/autocomplete
+document.addEventListener('DOMContentLoaded', function() {
+  var input = document.querySelector('input[data-autocomplete]');
+  var list = document.getElementById('search-suggestions');
+  if (!input || !list) return;
+
+  var pending = null;
+  input.addEventListener('input', function() {
+    var q = input.value;
+    if (pending) pending.abort();
+    if (!q) { list.innerHTML = ''; return; }
+
+    pending = new XMLHttpRequest();
+    pending.open('GET', '/api/autocomplete?type=' + input.getAttribute('data-autocomplete') + '&q=' + encodeURIComponent(q));
+    pending.onload = function() {
+      if (pending.status !== 200) return;
+      list.innerHTML = '';
+      JSON.parse(pending.responseText).forEach(function(result) {
+        var option = document.createElement('option');
+        option.value = result.name;
+        list.appendChild(option);
+      });
+    };
+    pending.send();
+  });
+});
@@ -0,0 +1,69 @@
+import os
+import time
+import uuid
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+
+#----------------------------------------------------------------------------#
+# Template bytecode.
+#----------------------------------------------------------------------------#
+
+# Compiled templates are stored in TEMPLATE_CACHE_DIR, shared by the workers
+# on a box, so a template is compiled once per release rather than once per
+# worker. Entries carry a checksum of the source and are recompiled when it
+# changes. At startup every template is loaded, so the first request of a
+# (re)started worker does not pay for compiling the ones it renders; under
+# gunicorn's preload_app that happens once in the master, before the fork.
+
+class AtomicBytecodeCache(FileSystemBytecodeCache):
+    # Another worker may read an entry while this one writes it.
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        temporary = '{}.{}.tmp'.format(filename, uuid.uuid4().hex)
+        with open(temporary, 'wb') as f:
+            bucket.write_bytecode(f)
+        os.replace(temporary, filename)
+
+
+def compile_all(environment):
+    names = environment.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        environment.get_template(name)
+    return names
+
+
+class TemplateCache:
+
+    def init_app(self, app):
+        directory = app.config.get('TEMPLATE_CACHE_DIR')
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = AtomicBytecodeCache(directory)
+        if app.config.get('TEMPLATE_WARMUP', True):
+            started = time.perf_counter()
+            names = compile_all(app.jinja_env)
+            app.logger.info('templates', extra={'fields': {
+                'compiled': len(names),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            }})
+
+
+template_cache = TemplateCache()
+
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    """Compile every template into TEMPLATE_CACHE_DIR ahead of a release."""
+    if current_app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('Set TEMPLATE_CACHE_DIR to compile templates ahead of time')
+    # Start over: drops entries left by earlier releases and the copies
+    # loaded at startup, so every template is compiled and written again.
+    current_app.jinja_env.bytecode_cache.clear()
+    current_app.jinja_env.cache.clear()
+    names = compile_all(current_app.jinja_env)
+    click.echo('{} templates compiled into {}'.format(len(names), current_app.config['TEMPLATE_CACHE_DIR']))
@@ -0,0 +1,82 @@
+# Listing pages must run a fixed number of statements however many rows
+# they show. Needs an empty PostgreSQL database: TestingConfig uses
+# TEST_DATABASE_URL, else the `fyyur_test` database next to `fyyur`.
+#
+#   python -m unittest discover tests
+
+import re
+import unittest
+from datetime import datetime, timedelta
+
+import flask_migrate
+from sqlalchemy import text
+
+from app import create_app
+from models import db, Venue, Artist, Show
+from partitions import ensure_partitions
+
+STATEMENTS = re.compile(r'desc="(\d+) statements"')
+
+
+class ListingStatementsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.context = cls.app.app_context()
+        cls.context.push()
+        flask_migrate.upgrade()
+        ensure_partitions(db.session.connection(), cls.app.config['SHOW_PARTITIONS_AHEAD'])
+        db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.context.pop()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        self.clear()
+
+    def tearDown(self):
+        self.clear()
+
+    def clear(self):
+        db.session.rollback()
+        db.session.execute(text('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+        db.session.commit()
+
+    def seed(self, count):
+        # One venue and one artist per show, so no two shows clash.
+        start = datetime.now().replace(microsecond=0) + timedelta(days=7)
+        for number in range(count):
+            venue = Venue(name='Venue {:04}'.format(number), city='City {}'.format(number % 3), state='CA')
+            artist = Artist(name='Artist {:04}'.format(number), city='City', state='CA')
+            db.session.add(Show(venue=venue, artist=artist, start_time=start))
+        db.session.commit()
+
+    def statements(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        timings = ', '.join(response.headers.getlist('Server-Timing'))
+        return int(STATEMENTS.search(timings).group(1))
+
+    def assertConstantStatements(self, path, count=5):
+        self.seed(count)
+        few = self.statements(path)
+        self.clear()
+        self.seed(count * 10)
+        self.assertEqual(self.statements(path), few)
+
+    def test_venues(self):
+        self.assertConstantStatements('/venues?limit=100')
+
+    def test_artists(self):
+        self.assertConstantStatements('/artists?limit=100')
+
+    def test_shows(self):
+        self.assertConstantStatements('/shows?limit=100')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# View models.
+#----------------------------------------------------------------------------#
+
+# Immutable rows for the detail templates, built straight from query
+# results so the views never hydrate (or dirty) mapped instances.
+
+class ShowTile(NamedTuple):
+    venue_id: int
+    venue_name: str
+    venue_image_link: Optional[str]
+    artist_id: int
+    artist_name: str
+    artist_image_link: Optional[str]
+    start_time: datetime
+
+
+class VenueDetail(NamedTuple):
+    id: int
+    name: str
+    genres: List[str]
+    address: Optional[str]
+    city: str
+    state: str
+    phone: Optional[str]
+    website: Optional[str]
+    facebook_link: Optional[str]
+    seeking_talent: bool
+    seeking_description: Optional[str]
+    image_link: Optional[str]
+    past_shows: List[ShowTile]
+    upcoming_shows: List[ShowTile]
+    past_shows_count: int
+    upcoming_shows_count: int
+
+
+class ArtistDetail(NamedTuple):
+    id: int
+    name: str
+    genres: List[str]
+    city: str
+    state: str
+    phone: Optional[str]
+    website: Optional[str]
+    facebook_link: Optional[str]
+    seeking_venue: bool
+    seeking_description: Optional[str]
+    image_link: Optional[str]
+    past_shows: List[ShowTile]
+    upcoming_shows: List[ShowTile]
+    past_shows_count: int
+    upcoming_shows_count: int
+
+
+#----------------------------------------------------------------------------#
+# Builders.
+#----------------------------------------------------------------------------#
+
+SHOW_FIELDS = ('past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count')
+
+def entity_columns(model, detail_class):
+    return [getattr(model, field) for field in detail_class._fields if field not in SHOW_FIELDS]
+
+def show_tiles_query(condition):
+    return db.session.query(
+            Show.venue_id,
+            Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link'),
+            Show.artist_id,
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            Show.start_time
+        ) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(condition) \
+        .order_by(Show.start_time)
+
+def show_tiles(condition):
+    return [ShowTile._make(row) for row in show_tiles_query(condition)]
+
+def split_shows(shows, now=None):
+    now = now or datetime.now()
+    past_shows = [show for show in shows if show.start_time <= now]
+    upcoming_shows = [show for show in shows if show.start_time > now]
+    return {
+        'past_shows': past_shows,
+        'upcoming_shows': upcoming_shows,
+        'past_shows_count': len(past_shows),
+        'upcoming_shows_count': len(upcoming_shows),
+    }
+
+def detail_query(model, detail_class, id):
+    return db.session.query(*entity_columns(model, detail_class)).filter(model.id == id)
+
+def detail(model, detail_class, show_column, id):
+    row = detail_query(model, detail_class, id).first()
+    if row is None:
+        return None
+
+    return detail_class(**row._asdict(), **split_shows(show_tiles(show_column == id)))
+
+def venue_detail(venue_id):
+    return detail(Venue, VenueDetail, Show.venue_id, venue_id)
+
+def artist_detail(artist_id):
+    return detail(Artist, ArtistDetail, Show.artist_id, artist_id)